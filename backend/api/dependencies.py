@@ -0,0 +1,46 @@
+# app/dependencies.py
+from backend.api.config import main_config, onlinesim_config
+from backend.api.utils.container import ServiceContainer
+
+
+def build_onlinesim_service():
+    from backend.api.services.onlinesim_service import OnlinesimService
+    return OnlinesimService(onlinesim_config)
+
+
+def build_executors():
+    from backend.api.utils.executors import DEFAULT_EXECUTOR_CONFIG, Executors
+    executor_config = dict(DEFAULT_EXECUTOR_CONFIG)
+    executor_config.update(main_config.get("executors", {}))
+    return Executors(**executor_config)
+
+
+def build_japanese_name_service():
+    # requests, bs4 и unidecode загружаются здесь, при первом запросе к /rna/generate/names
+    from backend.api.services.japanese_name_service import JapaneseNameService
+    return JapaneseNameService(container.get("executors"))
+
+
+def build_password_service():
+    from backend.api.services.password_service import PasswordService
+    return PasswordService(container.get("executors"))
+
+
+container = ServiceContainer()
+container.register("executors", build_executors)
+container.register("onlinesim", build_onlinesim_service)
+container.register("japanese_names", build_japanese_name_service)
+container.register("passwords", build_password_service)
+
+
+def get_onlinesim_service():
+    return container.get("onlinesim")
+
+
+def get_japanese_name_service():
+    return container.get("japanese_names")
+
+
+def get_password_service():
+    return container.get("passwords")
+
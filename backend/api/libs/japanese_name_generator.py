@@ -1,9 +1,7 @@
 import requests
-from bs4 import BeautifulSoup
 import random
 
 from requests.adapters import HTTPAdapter
-from unidecode import unidecode
 import os
 import sys
 
@@ -12,7 +10,8 @@ from urllib3 import Retry
 project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '../..'))
 if project_root not in sys.path:
     sys.path.append(project_root)
-from backend.api.utils.logger import logger
+from backend.api.utils.logger import get_logger
+logger = get_logger("japanese_name_generator")
 
 class JapaneseNameGenerator:
     def __init__(self, num_names=1, sex="male", firstname_rarity="very_rare", lastname_rarity="very_rare"):
@@ -21,7 +20,7 @@ class JapaneseNameGenerator:
         self.firstname_rarity = firstname_rarity
         self.lastname_rarity = lastname_rarity
         self.logger = logger
-        self.logger.info("Random Japanese names started..")
+        self.logger.debug("Random Japanese names started..")
 
     def generate_names(self):
         url = self.build_url()
@@ -29,13 +28,13 @@ class JapaneseNameGenerator:
 
         if response:
             names_list = self.parse_response(response)
-            self.logger.info("List of name was received.")
+            self.logger.debug("List of name was received.")
             if not names_list:
                 self.logger.warning("There was no names in response.")
                 return []
 
             random_names = random.sample(names_list, min(self.num_names, len(names_list)))
-            self.logger.info("All done well.")
+            self.logger.debug("All done well.")
             return random_names
 
         self.logger.error("An error occurred while executing the request.")
@@ -53,7 +52,7 @@ class JapaneseNameGenerator:
             "lastname_cond": "fukumu",
             "lastname_rarity": self.lastname_rarity,
         }
-        self.logger.info("URL was builded.")
+        self.logger.debug("URL was builded.")
         return f"{base_url}?{'&'.join([f'{key}={value}' for key, value in params.items()])}"
 
     def send_request(self, url):
@@ -64,16 +63,20 @@ class JapaneseNameGenerator:
         try:
             response = session.get(url, timeout=10)
             response.raise_for_status()
-            self.logger.info("Response 200 OK")
+            self.logger.debug("Response 200 OK")
             return response
         except requests.exceptions.RequestException as e:
-            self.logger.error(f"An error occurred while executing the request. {e}")
+            self.logger.error("An error occurred while executing the request. %s", e)
             return None
 
     def parse_response(self, response):
+        # bs4 и unidecode тяжёлые и нужны только здесь: грузим при первом разборе, а не при старте API
+        from bs4 import BeautifulSoup
+        from unidecode import unidecode
+
         soup = BeautifulSoup(response.text, "html.parser")
         name_elements = soup.find_all("td", class_="name")
-        self.logger.info("Names parsed well.")
+        self.logger.debug("Names parsed well.")
         return [unidecode(name.text.strip()) for name in name_elements]
 
 # Test usage
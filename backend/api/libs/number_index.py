@@ -0,0 +1,143 @@
+# app/libs/number_index.py
+from array import array
+from bisect import bisect_right
+import sys
+from backend.api.libs.onlinesim_lib import parse_age, sort_numbers
+
+# Поля, которые можно запросить через fields=
+COUNTRY_FIELDS = {"count", "numbers", "fetched_at"}
+NUMBER_FIELDS = {"full_number", "number", "age", "age_seconds"}
+
+
+class NumberIndex:
+    """
+    Номера одной страны, отсортированные от самых свежих к самым старым, в колоночном виде.
+
+    Вместо списка словарей хранятся параллельные кортежи full_number/number/age и массив
+    возрастов в секундах; страна и тексты возраста ("3 days ago") интернированы и общие
+    для всего кэша. Словари публичного формата собираются только при сериализации.
+    Массив ages (возраст на момент получения) позволяет выбирать номера не старше max_age
+    через bisect, не пересортировывая их на каждый запрос.
+    """
+
+    __slots__ = ("country", "full_numbers", "numbers", "age_texts", "ages")
+
+    def __init__(self, country, full_numbers, numbers, age_texts, ages):
+        self.country = sys.intern(country) if country else country
+        self.full_numbers = tuple(full_numbers)
+        self.numbers = tuple(numbers)
+        self.age_texts = tuple(sys.intern(age) for age in age_texts)
+        self.ages = array("l", ages)
+
+    def __eq__(self, other):
+        if not isinstance(other, NumberIndex):
+            return NotImplemented
+        return (
+            self.country == other.country
+            and self.full_numbers == other.full_numbers
+            and self.numbers == other.numbers
+            and self.age_texts == other.age_texts
+            and self.ages == other.ages
+        )
+
+    __hash__ = None
+
+    @classmethod
+    def from_numbers(cls, numbers, country=None):
+        """Строит индекс из произвольного списка номеров (в том числе из старого снимка без age_seconds)."""
+        prepared = []
+        for number in numbers:
+            if number.get("age_seconds") is None:
+                age_seconds = parse_age(number.get("age"))
+                if age_seconds is None:
+                    continue
+                number = dict(number, age_seconds=age_seconds)
+            prepared.append(number)
+        prepared = sort_numbers(prepared)
+        if country is None:
+            country = prepared[0].get("country") if prepared else None
+        return cls(
+            country,
+            (number["full_number"] for number in prepared),
+            (number["number"] for number in prepared),
+            (number["age"] for number in prepared),
+            (number["age_seconds"] for number in prepared),
+        )
+
+    def record(self, position):
+        """Номер в публичном формате API."""
+        return {
+            "country": self.country,
+            "full_number": self.full_numbers[position],
+            "number": self.numbers[position],
+            "age": self.age_texts[position],
+            "age_seconds": self.ages[position],
+        }
+
+    def records(self, end=None):
+        end = len(self.full_numbers) if end is None else end
+        return [self.record(position) for position in range(end)]
+
+    def column(self, field):
+        """Значения одного поля для всех номеров (для проекции fields=)."""
+        if field == "country":
+            return [self.country] * len(self.full_numbers)
+        return {
+            "full_number": self.full_numbers,
+            "number": self.numbers,
+            "age": self.age_texts,
+            "age_seconds": self.ages,
+        }[field]
+
+    def query(self, max_age=None, limit=None):
+        """Номера не старше max_age секунд, не больше limit штук."""
+        end = len(self.full_numbers) if max_age is None else bisect_right(self.ages, max_age)
+        if limit is not None:
+            end = min(end, limit)
+        return self.records(end)
+
+    def to_list(self):
+        return self.records()
+
+    def __len__(self):
+        return len(self.full_numbers)
+
+    def __iter__(self):
+        return (self.record(position) for position in range(len(self.full_numbers)))
+
+
+def parse_fields(fields):
+    """Разбирает "count,full_number" в множество полей. Неизвестные поля — ValueError."""
+    if not fields:
+        return None
+    requested = {field.strip() for field in fields.split(",") if field.strip()}
+    unknown = requested - COUNTRY_FIELDS - NUMBER_FIELDS
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(sorted(unknown))}")
+    return requested
+
+
+def project_country(country, index, fetched_at=None, fields=None):
+    """
+    Представление страны для ответа API с учётом проекции.
+
+    Без fields возвращаются count и все номера целиком. Поля номеров (full_number, age, ...)
+    включают список numbers только с этими полями; "count" без них — только количество.
+    """
+    count = len(index) if index is not None else 0
+    if fields is None:
+        return {"country": country, "count": count, "numbers": index.to_list() if index is not None else []}
+
+    item = {"country": country}
+    if "count" in fields:
+        item["count"] = count
+    if "fetched_at" in fields:
+        item["fetched_at"] = fetched_at
+    number_fields = sorted(fields & NUMBER_FIELDS)
+    if number_fields:
+        # Собираем проекцию прямо из колонок, не создавая полные словари номеров
+        columns = [index.column(field) for field in number_fields] if index is not None else []
+        item["numbers"] = [dict(zip(number_fields, values)) for values in zip(*columns)]
+    elif "numbers" in fields:
+        item["numbers"] = index.to_list() if index is not None else []
+    return item
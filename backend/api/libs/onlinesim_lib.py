@@ -1,63 +1,274 @@
 # app/libs/onlinesim_lib.py
+import asyncio
+import hashlib
+import json
 import re
+import time
+from collections import OrderedDict
+from urllib.parse import urlsplit
 import aiohttp
-import os
-import sys
-project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '../..'))
-if project_root not in sys.path:
-    sys.path.append(project_root)
-from backend.api.utils.logger import logger
+from backend.api.utils.circuit_breaker import CLOSED
+from backend.api.utils.logger import get_logger
+from backend.api.utils.metrics import UPSTREAM_REQUEST_DURATION, UPSTREAM_REQUESTS_IN_FLIGHT
+from backend.api.utils.profiling import record_timing, timed
+logger = get_logger("onlinesim_lib")
 logging = logger
 
-def is_relevant_number(age, show_all):
-    day_match = re.match(r"(\d+) days? ago", age)
-    hour_match = re.match(r"(\d+) hours? ago", age)
-    week_match = re.match(r"(\d+) week ago", age)
-
-    if day_match:
-        days = int(day_match.group(1))
-        return days <= 7  # Оставляем только те, что не старше недели
-    elif hour_match:
-        hours = int(hour_match.group(1))
-        return hours <= 168  # 168 часов = 7 дней
-    elif week_match:
-        week = int(week_match.group(1))
-        return week <= 0 and not show_all
-    else:
-        return False
-
-async def fetch_data(session, url, headers):
+# Возраст номера в upstream приходит строкой вида "3 days ago" / "an hour ago"
+AGE_PATTERN = re.compile(r"^\s*(\d+|an?)\s+(second|minute|hour|day|week|month|year)s?\s+ago", re.IGNORECASE)
+JUST_NOW_PATTERN = re.compile(r"^\s*(just now|now|a few seconds ago)", re.IGNORECASE)
+AGE_UNIT_SECONDS = {
+    "second": 1,
+    "minute": 60,
+    "hour": 3600,
+    "day": 86400,
+    "week": 7 * 86400,
+    "month": 30 * 86400,
+    "year": 365 * 86400,
+}
+MAX_NUMBER_AGE = 7 * 86400  # Оставляем только номера не старше недели
+
+
+def parse_age(age):
+    """Переводит "3 days ago" в секунды. Возвращает None, если строку разобрать не удалось."""
+    if not age:
+        return None
+    match = AGE_PATTERN.match(age)
+    if match:
+        amount, unit = match.groups()
+        amount = 1 if amount.lower() in ("a", "an") else int(amount)
+        return amount * AGE_UNIT_SECONDS[unit.lower()]
+    if JUST_NOW_PATTERN.match(age):
+        return 0
+    return None
+
+
+def is_relevant_number(age_seconds):
+    """Номер подходит, если его возраст известен и не превышает неделю."""
+    return age_seconds is not None and age_seconds <= MAX_NUMBER_AGE
+
+
+class UpstreamError(Exception):
+    """Ошибка запроса к upstream. status — HTTP-статус или None для сетевых ошибок/таймаутов."""
+
+    fail_fast = False
+
+    def __init__(self, url, status=None, message=""):
+        super().__init__(f"{url}: {status or ''} {message}".strip())
+        self.url = url
+        self.status = status
+
+
+class CircuitOpenError(UpstreamError):
+    """Запрос не выполнялся: circuit breaker хоста открыт. retry_after — когда пробовать снова."""
+
+    fail_fast = True
+
+    def __init__(self, url, retry_after=0.0):
+        super().__init__(url, None, "circuit open")
+        self.retry_after = retry_after
+
+
+def is_upstream_failure(status):
+    """Какие ответы считаются отказом upstream для circuit breaker (4xx кроме 429 — нет)."""
+    return status is None or status == 429 or status >= 500
+
+
+def is_retryable(error):
+    """Повторяем только сетевые ошибки и 5xx; 429 и открытый circuit breaker — нет."""
+    return isinstance(error, UpstreamError) and not error.fail_fast and (error.status is None or error.status >= 500)
+
+
+async def _get_once(session, url, headers, breaker=None):
+    if breaker is not None and not breaker.allow():
+        raise CircuitOpenError(url, breaker.retry_after())
+    host = breaker.name if breaker is not None else urlsplit(url).hostname
+    outcome = "ok"
+    started = time.perf_counter()
+    UPSTREAM_REQUESTS_IN_FLIGHT.inc(host)
     try:
         async with session.get(url, headers=headers) as response:
-            response.raise_for_status()
-            return await response.json()
-    except aiohttp.ClientError as e:
-        logger.error(f"Failed to fetch data from {url}: {e}")
+            if response.status == 304:
+                status, response_headers, body = 304, response.headers, b""
+            else:
+                response.raise_for_status()
+                status, response_headers, body = response.status, response.headers, await response.read()
+    except aiohttp.ClientResponseError as e:
+        outcome = f"http_{e.status}"
+        if breaker is not None and is_upstream_failure(e.status):
+            breaker.record_failure()
+        raise UpstreamError(url, e.status, e.message) from e
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+        outcome = "network_error"
+        if breaker is not None:
+            breaker.record_failure()
+        raise UpstreamError(url, None, repr(e)) from e
+    except asyncio.CancelledError:
+        # Отменили по дедлайну или проиграли hedging — это не отказ upstream
+        outcome = "cancelled"
+        if breaker is not None:
+            breaker.release()
+        raise
+    finally:
+        elapsed = time.perf_counter() - started
+        UPSTREAM_REQUESTS_IN_FLIGHT.dec(host)
+        UPSTREAM_REQUEST_DURATION.observe(elapsed, host, outcome)
+        record_timing("upstream", elapsed)
+    if breaker is not None:
+        breaker.record_success()
+    return status, response_headers, body
+
+
+async def _get(session, url, headers, breaker=None, policy=None):
+    """
+    GET через circuit breaker. Возвращает (status, response_headers, body).
+
+    Любую ошибку превращает в UpstreamError; при открытой цепи — CircuitOpenError без запроса.
+    policy (UpstreamCallPolicy) добавляет повторы и hedging в пределах дедлайна запроса;
+    если бюджет исчерпан, поднимается DeadlineExceeded.
+    """
+    if policy is None:
+        return await _get_once(session, url, headers, breaker)
+    return await policy.call(
+        lambda: _get_once(session, url, headers, breaker),
+        retryable=is_retryable,
+        # В half-open лишний пробный запрос недопустим, поэтому дублируем только при закрытой цепи
+        hedge=breaker is None or breaker.state == CLOSED,
+    )
+
+
+async def fetch_data(session, url, headers, raise_errors=False, breaker=None, policy=None):
+    """
+    Выполняет GET-запрос и возвращает JSON-ответ.
+
+    При ошибке логирует её и возвращает {}; с raise_errors=True поднимает UpstreamError,
+    чтобы вызывающий код (например, планировщик обновления) мог отреагировать на статус.
+    """
+    try:
+        _, _, body = await _get(session, url, headers, breaker, policy)
+        with timed("parse"):
+            return json.loads(body)
+    except CircuitOpenError:
+        logger.warning("Circuit open, skipping request to %s", url)
+        if raise_errors:
+            raise
+        return {}
+    except UpstreamError as e:
+        logger.error("Failed to fetch data from %s: %s", url, e)
+        if raise_errors:
+            raise
+        return {}
+    except ValueError as e:
+        logger.error("Invalid JSON from %s: %s", url, e)
+        if raise_errors:
+            raise UpstreamError(url, None, "invalid JSON") from e
         return {}
 
 
-async def fetch_fresh_numbers(session, country, headers, urls, show_all=False):
+async def fetch_data_conditional(
+    session, url, headers, fingerprint=None, raise_errors=False, breaker=None, policy=None
+):
+    """
+    Условный GET: отправляет If-None-Match/If-Modified-Since из прошлого fingerprint.
+
+    Возвращает (data, fingerprint). data равно None, если upstream ответил 304 или тело
+    совпало по хэшу с прошлым ответом, т.е. данные не изменились.
+    """
+    request_headers = dict(headers)
+    if fingerprint:
+        if fingerprint.get("etag"):
+            request_headers["If-None-Match"] = fingerprint["etag"]
+        if fingerprint.get("last_modified"):
+            request_headers["If-Modified-Since"] = fingerprint["last_modified"]
+    try:
+        status, response_headers, body = await _get(session, url, request_headers, breaker, policy)
+    except CircuitOpenError:
+        logger.warning("Circuit open, skipping request to %s", url)
+        if raise_errors:
+            raise
+        return {}, None
+    except UpstreamError as e:
+        logger.error("Failed to fetch data from %s: %s", url, e)
+        if raise_errors:
+            raise
+        return {}, None
+
+    if status == 304 and fingerprint:
+        return None, fingerprint
+    new_fingerprint = {
+        "etag": response_headers.get("ETag"),
+        "last_modified": response_headers.get("Last-Modified"),
+        "hash": hashlib.blake2b(body, digest_size=16).hexdigest(),
+    }
+    if fingerprint and fingerprint.get("hash") == new_fingerprint["hash"]:
+        return None, new_fingerprint
+    try:
+        with timed("parse"):
+            return json.loads(body), new_fingerprint
+    except ValueError as e:
+        logger.error("Invalid JSON from %s: %s", url, e)
+        if raise_errors:
+            raise UpstreamError(url, None, "invalid JSON") from e
+        return {}, None
+
+
+def parse_fresh_numbers(data, country):
+    """Выбирает из ответа upstream подходящие номера страны."""
+    with timed("parse"):
+        return _parse_fresh_numbers(data, country)
+
+
+def _parse_fresh_numbers(data, country):
+    fresh_numbers = []
+    for number_info in data.get("numbers", []):
+        # Возраст разбираем один раз при получении и дальше работаем только с числом
+        age_seconds = parse_age(number_info["data_humans"])
+        if is_relevant_number(age_seconds):
+            fresh_numbers.append({
+                "country": country,
+                "full_number": number_info["full_number"],
+                "number": number_info["number"],
+                "age": number_info["data_humans"],
+                "age_seconds": age_seconds,
+            })
+    return fresh_numbers
+
+
+async def fetch_fresh_numbers(
+    session, country, headers, urls, raise_errors=False, breaker=None, policy=None
+):
     url = urls["fetch_numbers_url"].format(country=country)
-    data = await fetch_data(session, url, headers)
-    fresh_numbers = [
-        {
-            "country": country,
-            "full_number": number_info["full_number"],
-            "number": number_info["number"],
-            "age": number_info["data_humans"]
-        }
-        for number_info in data.get("numbers", [])
-        if is_relevant_number(number_info["data_humans"], show_all=show_all)
-    ]
-    logger.info(f"Fetched {len(fresh_numbers)} fresh numbers for {country}.")
+    data = await fetch_data(session, url, headers, raise_errors=raise_errors, breaker=breaker, policy=policy)
+    fresh_numbers = parse_fresh_numbers(data, country)
+    logger.debug("Fetched %d fresh numbers for %s.", len(fresh_numbers), country)
     return fresh_numbers
 
 
-async def fetch_last_3_sms(session, country, number, headers, urls):
+async def fetch_numbers_delta(
+    session, country, headers, urls, fingerprint=None, raise_errors=False, breaker=None, policy=None
+):
+    """
+    Как fetch_fresh_numbers, но пропускает разбор неизменившегося ответа.
+
+    Возвращает (numbers, fingerprint); numbers равно None, если данные страны не изменились.
+    """
+    url = urls["fetch_numbers_url"].format(country=country)
+    data, new_fingerprint = await fetch_data_conditional(
+        session, url, headers, fingerprint=fingerprint, raise_errors=raise_errors, breaker=breaker, policy=policy
+    )
+    if data is None:
+        logger.debug("Numbers for %s unchanged.", country)
+        return None, new_fingerprint
+    fresh_numbers = parse_fresh_numbers(data, country)
+    logger.debug("Fetched %d fresh numbers for %s.", len(fresh_numbers), country)
+    return fresh_numbers, new_fingerprint
+
+
+async def fetch_last_3_sms(session, country, number, headers, urls, raise_errors=False, breaker=None, policy=None):
     url = urls["fetch_sms_url"].format(country=country, number=number)
-    data = await fetch_data(session, url, headers)
+    data = await fetch_data(session, url, headers, raise_errors=raise_errors, breaker=breaker, policy=policy)
     messages_data = data.get("messages", {}).get("data", [])
-    logger.info(f"Fetched {len(messages_data)} SMS for number {number} in {country}.")
+    logger.debug("Fetched %d SMS for number %s in %s.", len(messages_data), number, country)
 
     return [
         {
@@ -71,15 +282,75 @@ async def fetch_last_3_sms(session, country, number, headers, urls):
 
 
 def sort_numbers(fresh_numbers):
-    most_recent = [num for num in fresh_numbers if num["age"] in ["1 day ago", "12 hours ago"]]
-    older_numbers = [num for num in fresh_numbers if num["age"] not in ["1 day ago", "12 hours ago"]]
-    older_numbers.sort(key=lambda x: x["age"])
-    return most_recent + older_numbers
+    """Сортирует номера от самых свежих к самым старым по возрасту в секундах."""
+    return sorted(fresh_numbers, key=lambda number: number["age_seconds"])
+
+
+# Слова, после которых в SMS обычно идёт код подтверждения (на разных языках)
+CODE_PREFIXES = (
+    r"code|codes|код|кода|kod|kode|kodu|código|codigo|codice|pin|otp|passcode|password|пароль|parol"
+    r"|token|verification|подтверждения|验证码|驗證碼|認証コード|인증번호"
+)
+# Сам код: содержит хотя бы одну цифру; "123-456", "123 456", "AB-12CD" или сплошные 4–8 символов
+CODE_TOKEN = r"(?=[A-Za-z0-9-]*\d)([A-Za-z0-9]{2,4}-[A-Za-z0-9]{2,4}|\d{3} \d{3}|[A-Za-z0-9]{4,8})(?![\w-])"
+# Шаблоны в порядке приоритета: первый сработавший определяет код
+CODE_PATTERNS = (
+    # "Your code: 123-456", "Код подтверждения 4821", "验证码：123456"
+    re.compile(rf"(?:{CODE_PREFIXES})\W{{0,3}}(?:(?:is|es|ist|est|это)\s+)?{CODE_TOKEN}", re.IGNORECASE),
+    # "123-456" / "123 456" без префикса
+    re.compile(r"(?<![\w-])(\d{3}[- ]\d{3})(?![\w-])"),
+    # "G-482913", "4821"
+    re.compile(r"(?<!\w)(\d{4,8})(?!\w)"),
+    # Буквенно-цифровые коды заглавными буквами: "X7K2QP"
+    re.compile(r"(?<!\w)((?=[A-Z]*\d)(?=\d*[A-Z])[A-Z0-9]{5,8})(?!\w)"),
+)
+CODE_SEPARATORS = re.compile(r"[- ]")
 
 
 def extract_code_from_text(text):
-    match = re.search(r'\b(\d{4,6})\b', text)
-    return match.group(1) if match else None
+    """Код подтверждения из текста SMS без разделителей ("123-456" -> "123456") или None."""
+    if not text:
+        return None
+    for pattern in CODE_PATTERNS:
+        match = pattern.search(text)
+        if match:
+            return CODE_SEPARATORS.sub("", match.group(1))
+    return None
+
+
+class CodeExtractor:
+    """
+    Извлечение кодов с мемоизацией по id сообщения.
+
+    Текст SMS с данным id не меняется, поэтому повторные опросы номера не сканируют
+    уже разобранные сообщения заново. Хранится не больше max_entries последних id.
+    """
+
+    def __init__(self, max_entries=10000):
+        self.max_entries = max_entries
+        self.codes = OrderedDict()  # id сообщения -> код или None
+
+    def extract(self, message):
+        message_id = message.get("id")
+        if message_id is None:
+            return extract_code_from_text(message.get("text"))
+        if message_id in self.codes:
+            self.codes.move_to_end(message_id)
+            return self.codes[message_id]
+        code = extract_code_from_text(message.get("text"))
+        self.codes[message_id] = code
+        if len(self.codes) > self.max_entries:
+            self.codes.popitem(last=False)
+        return code
+
+    def codes_for(self, sms_list):
+        """Коды из списка SMS (от новых к старым); сообщения без кода пропускаются."""
+        codes = []
+        for message in sms_list:
+            code = self.extract(message)
+            if code is not None:
+                codes.append({"id": message["id"], "code": code, "time": message.get("time")})
+        return codes
 
 
 
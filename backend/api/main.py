@@ -7,12 +7,18 @@ if project_root not in sys.path:
 from pathlib import Path
 from dotenv import load_dotenv
 from fastapi import FastAPI
+from fastapi.responses import Response
 from contextlib import asynccontextmanager
 from backend.api.config import main_config, onlinesim_config
-from backend.api.routes.onlinesim_routes import router as onlinesim_router, limiter
-from backend.api.services.onlinesim_service import OnlinesimService
+from backend.api.dependencies import container
+from backend.api.routes.onlinesim_routes import router as onlinesim_router
 from backend.api.routes.rna_routes import router as rna_router
+from backend.api.routes.admin_routes import router as admin_router
+from backend.api.utils.deadline import DEFAULT_DEADLINE_CONFIG, DeadlineMiddleware
+from backend.api.utils.http_session import create_client_session
 from backend.api.utils.logger import logger
+from backend.api.utils.metrics import CONTENT_TYPE, MetricsMiddleware, registry
+from backend.api.utils.profiling import ServerTimingMiddleware
 logging = logger
 cache = {}
 
@@ -26,23 +32,55 @@ version = main_config.get("version", "0.1.0.0"),
 description = main_config.get("description", "Default API description"),
 author = main_config.get("author", "9733n")
 
-onlinesim_service = OnlinesimService(onlinesim_config)
+
+async def periodic_cache_update(onlinesim_service):
+    interval = onlinesim_config.get("cache", {}).get("refresh_interval", 60)
+    while True:
+        await asyncio.sleep(interval)  # Проверяем раз в минуту, какие страны пора обновить
+        try:
+            # В upstream ходит только воркер-лидер; если лидер умер, его место занимает этот
+            if onlinesim_service.acquire_leadership():
+                await onlinesim_service.leader_tick()
+        except Exception as e:
+            logging.exception(f"Periodic cache update failed: {e}")
 
 
-async def periodic_cache_update():
+async def shared_cache_sync(onlinesim_service):
+    interval = onlinesim_config.get("shared", {}).get("sync_interval", 30)
     while True:
-        # TODO:
-        logging.info("RELOAD SMTHNG.")
-        await asyncio.sleep(300)  # Обновлять каждые 5 минут
+        await asyncio.sleep(interval)
+        # Спрос последователей нужен лидеру для выбора интервалов обновления, а страны,
+        # загруженные при промахе любым воркером, — всем остальным, включая лидера
+        await onlinesim_service.share_demand()
+        await onlinesim_service.sync_shared_cache()
 
 
 # В lifespan добавьте фоновую задачу
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    app.state.task = asyncio.create_task(periodic_cache_update())
+    # Один пул соединений к onlinesim.site на всё время жизни приложения
+    app.state.http_session = create_client_session(onlinesim_config.get("http"))
+    # Сервис numbers нужен фоновым задачам, поэтому создаётся здесь; остальные — при первом запросе
+    onlinesim_service = container.get("onlinesim")
+    onlinesim_service.register_metrics(registry)
+    onlinesim_service.attach_session(app.state.http_session)
+    # Тёплый старт из снимка на диске, сверка с upstream — в фоне
+    onlinesim_service.load_snapshot()
+    onlinesim_service.acquire_leadership()
+    app.state.reconcile_task = asyncio.create_task(onlinesim_service.reconcile())
+    app.state.task = asyncio.create_task(periodic_cache_update(onlinesim_service))
+    app.state.sync_task = asyncio.create_task(shared_cache_sync(onlinesim_service))
     yield
-    app.state.task.cancel()
-    await app.state.task
+    # Фоновые задачи дожидаемся до закрытия сессии, пулов и снимка: иначе отменённая задача
+    # могла бы ещё выполнять запрос через уже закрытый ресурс
+    tasks = [app.state.reconcile_task, app.state.sync_task, app.state.task, *onlinesim_service.background_tasks]
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    await onlinesim_service.save_snapshot()
+    onlinesim_service.release_leadership()
+    await container.close()
+    await app.state.http_session.close()
 
 app = FastAPI(
     title=title,
@@ -51,6 +89,18 @@ app = FastAPI(
     lifespan=lifespan
 )
 logger.info(f"FASTAPI: {title} {version} {description}")
+# Дедлайн на каждый запрос к /numbers/*: хвост задержек ограничен конфигурацией, а не upstream
+deadline_config = dict(DEFAULT_DEADLINE_CONFIG)
+deadline_config.update(onlinesim_config.get("deadline", {}))
+app.add_middleware(
+    DeadlineMiddleware,
+    budget=deadline_config["request_budget"],
+    path_prefix=deadline_config["path_prefix"],
+)
+# Server-Timing снаружи дедлайна: разбивка по фазам и профилирование запросов по маршруту
+app.add_middleware(ServerTimingMiddleware)
+# Метрики добавляются последними: внешний слой, видит полное время каждого запроса
+app.add_middleware(MetricsMiddleware)
 if api_key:
     onlinesim_config["headers"]["Authorization"] = api_key
 else:
@@ -59,6 +109,7 @@ else:
 # Подключение маршрутов
 app.include_router(onlinesim_router, prefix="/numbers", tags=["OnlineSim Numbers"])
 app.include_router(rna_router, prefix="/rna", tags=["RNA Project"])
+app.include_router(admin_router, prefix="/admin")
 
 logger.info("Application initialized successfully.")
 
@@ -84,6 +135,11 @@ def read_root():
         logging.exception(f"Error occurred in root endpoint: {e}")
         return {"error": "Internal Server Error"}
 
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    """Метрики процесса в текстовом формате Prometheus."""
+    return Response(content=registry.render(), media_type=CONTENT_TYPE)
+
 if __name__ == "__main__":
     logging.info("Main: Loading certificates...")
     cert_dir = "api/certs"
@@ -0,0 +1,51 @@
+import asyncio
+import secrets
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
+from fastapi.responses import PlainTextResponse
+from backend.api.utils.logger import logger
+from backend.api.utils.profiling import admin_token, request_profiler, sample_loop
+logging = logger
+
+router = APIRouter(include_in_schema=False)
+
+# Одновременно работает только один профайлер: сэмплы двух сессий смешались бы
+profile_lock = asyncio.Lock()
+
+
+def require_admin(x_admin_token: str = Header(None)):
+    """Пускает только с заголовком X-Admin-Token, равным ADMIN_TOKEN из окружения."""
+    token = admin_token()
+    if token is None:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not x_admin_token or not secrets.compare_digest(x_admin_token, token):
+        raise HTTPException(status_code=403, detail="Forbidden")
+
+
+@router.get("/profile", response_class=PlainTextResponse, dependencies=[Depends(require_admin)])
+async def profile(
+    seconds: float = Query(None, gt=0, le=120, description="Sample the event loop for this many seconds"),
+    route: str = Query(None, description="Profile the next requests to this route template, e.g. /numbers/{country}"),
+    requests: int = Query(10, ge=1, le=1000, description="How many requests to the route to profile"),
+    timeout: float = Query(60, gt=0, le=600, description="Give up waiting for route requests after this many seconds"),
+    interval_ms: float = Query(5, ge=1, le=100, description="Sampling interval in milliseconds"),
+):
+    """
+    Сэмплирующий профайлер event loop; ответ — collapsed stacks для flamegraph.pl или speedscope.
+
+    Либо seconds секунд всего, что выполняет event loop, либо только следующие requests
+    запросов к route (не дольше timeout).
+    """
+    if (seconds is None) == (route is None):
+        raise HTTPException(status_code=400, detail="Pass either seconds or route")
+    if profile_lock.locked():
+        raise HTTPException(status_code=409, detail="Another profiling session is running")
+
+    async with profile_lock:
+        interval = interval_ms / 1000
+        if route is not None:
+            logging.info("Profiling next %d requests to %s", requests, route)
+            sampler = await request_profiler.capture(route, requests, timeout, interval)
+        else:
+            logging.info("Profiling event loop for %ss", seconds)
+            sampler = await sample_loop(seconds, interval)
+    return PlainTextResponse(sampler.collapsed(), headers={"X-Profile-Samples": str(sampler.samples)})
@@ -1,26 +1,56 @@
 import asyncio
-import os
-import sys
-project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '../..'))
-if project_root not in sys.path:
-    sys.path.append(project_root)
-from fastapi import APIRouter, HTTPException, Query, Request, FastAPI
-from slowapi import Limiter
-from slowapi.util import get_remote_address
-from backend.api.config import onlinesim_config
-from backend.api.services.onlinesim_service import OnlinesimService
+import json
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field
+from backend.api.dependencies import get_onlinesim_service
+from backend.api.libs.number_index import parse_fields
+from backend.api.libs.onlinesim_lib import UpstreamError
+from backend.api.services.onlinesim_service import OnlinesimService, UnknownCountryError
+from backend.api.utils.admission import AdmissionRejected
+from backend.api.utils.deadline import DeadlineExceeded
+from backend.api.utils.demand_tracker import ALL_KEYS
 from backend.api.utils.logger import logger
 logging = logger
 
-# Лимитер запросов
-limiter = Limiter(key_func=get_remote_address)
 router = APIRouter(
     tags=["Numbers"],
     responses={404: {"description": "Not found"}},
 )
 
-onlinesim_service = OnlinesimService(onlinesim_config)
 __version__ = '0.0.1.3'
+MAX_BATCH_SIZE = 50
+
+
+def upstream_unavailable(error):
+    """
+    Ответ с Retry-After, когда отдать из кэша нечего, а upstream не ответил.
+
+    502 — upstream вернул ошибку или не отвечает; 503 — запрос к нему не выполнялся
+    (открыт circuit breaker, страна на паузе после ошибок, перегрузка).
+    """
+    retry_after = max(1, int(round(getattr(error, "retry_after", 0) or 1)))
+    failed = isinstance(error, UpstreamError) and not error.fail_fast
+    return HTTPException(
+        status_code=502 if failed else 503,
+        detail="Upstream request failed" if failed else "Upstream temporarily unavailable",
+        headers={"Retry-After": str(retry_after)},
+    )
+
+
+class SmsBatchItem(BaseModel):
+    country: str
+    number: str
+
+
+class SmsBatchRequest(BaseModel):
+    items: list[SmsBatchItem] = Field(..., min_length=1, max_length=MAX_BATCH_SIZE)
+
+
+def iter_ndjson(items):
+    """Сериализует страны по одной, не собирая весь ответ в памяти."""
+    for item in items:
+        yield json.dumps(item, ensure_ascii=False) + "\n"
 
 
 @router.get("/", summary="Root endpoint for Onlinesim Free API Service")
@@ -29,20 +59,52 @@ async def index():
     return {"message": "Welcome to Onlinesim Free API Service", "version": __version__}
 
 @router.get("/countries", summary="Get list of fresh countries with numbers")
-async def get_countries():
+async def get_countries(
+    request: Request,
+    cursor: str = Query(None, description="Return countries after this one (next_cursor of the previous page)"),
+    limit: int = Query(None, ge=1, le=100, description="Countries per page"),
+    fields: str = Query(None, description="Comma-separated projection: count, numbers, fetched_at, full_number, number, age, age_seconds"),
+    format: str = Query(None, pattern="^(json|ndjson)$", description="ndjson streams one country per line"),
+    onlinesim_service: OnlinesimService = Depends(get_onlinesim_service),
+):
+    """
+    Без параметров возвращает весь кеш {"countries": {country: [numbers]}}.
+    С cursor/limit/fields — страницу [{country, count, numbers}] и next_cursor.
+    С format=ndjson (или Accept: application/x-ndjson) — поток по одной стране на строку.
+    """
     try:
-        # Возвращаем текущий кеш
-        fresh_countries = await onlinesim_service.get_cache()
-        return {"countries": fresh_countries}
+        try:
+            projection = parse_fields(fields)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+        onlinesim_service.demand.record(ALL_KEYS)
+        stream = format == "ndjson" or (format is None and "application/x-ndjson" in request.headers.get("accept", ""))
+        if stream:
+            await onlinesim_service.ensure_cache()
+            items = onlinesim_service.iter_countries(cursor=cursor, limit=limit, fields=projection)
+            return StreamingResponse(iter_ndjson(items), media_type="application/x-ndjson")
+
+        if cursor is None and limit is None and projection is None:
+            # Возвращаем текущий кеш, сериализованный и сжатый один раз на версию (или 304)
+            return await onlinesim_service.get_cache_response(request.headers)
+
+        await onlinesim_service.ensure_cache()
+        items, next_cursor = onlinesim_service.list_countries(cursor=cursor, limit=limit, fields=projection)
+        return {"countries": items, "next_cursor": next_cursor}
+    except HTTPException:
+        raise
     except Exception as e:
         logger.exception(f"Error fetching fresh countries: {e}")
         raise HTTPException(status_code=500, detail="Internal Server Error")
 
 @router.get("/update", summary="Manually trigger cache update")
-async def cache_update():
+async def cache_update(onlinesim_service: OnlinesimService = Depends(get_onlinesim_service)):
     try:
         if onlinesim_service.update_in_progress:
             return {"message": "Cache update already in progress."}
+        if not onlinesim_service.is_leader:
+            return {"message": "Cache update is handled by the refresh leader worker."}
 
         asyncio.create_task(onlinesim_service.update_cache())
         return {"message": "Cache update started."}
@@ -50,27 +112,185 @@ async def cache_update():
         logger.exception(f"Error starting cache update: {e}")
         raise HTTPException(status_code=500, detail="Internal Server Error")
 
+@router.get("/update/status", summary="Get status of the last cache update sweep")
+async def cache_update_status(onlinesim_service: OnlinesimService = Depends(get_onlinesim_service)):
+    """Возвращает длительность последнего sweep и конкурентность, на которой он остановился."""
+    return {
+        "update_in_progress": onlinesim_service.update_in_progress,
+        "last_sweep": onlinesim_service.last_sweep,
+        "is_leader": onlinesim_service.is_leader,
+        "circuit_breakers": onlinesim_service.breakers.states(),
+        "hot_countries": onlinesim_service.demand.top(),
+        "sms_watch": onlinesim_service.sms_watch.stats(),
+        "upstream_calls": onlinesim_service.upstream_policy.stats(),
+        "admission": onlinesim_service.admission.stats(),
+    }
+
+@router.get("/changes", summary="Get per-country number changes since a cache version")
+async def get_changes(
+    since: int = Query(0, ge=0, description="Return changes made after this cache version"),
+    epoch: str = Query(None, description="Epoch returned together with the since version"),
+    onlinesim_service: OnlinesimService = Depends(get_onlinesim_service),
+):
+    """
+    Возвращает эпоху и версию кэша и добавленные/удалённые номера по странам после версии since.
+
+    Версии считаются в каждом процессе отдельно: если epoch не совпадает с текущей,
+    ответ содержит full_reload=True и клиенту нужно перечитать страны.
+    """
+    return onlinesim_service.get_changes(since, epoch)
+
+@router.get("/codes", summary="Get verification codes for a batch of numbers")
+async def get_codes(
+    numbers: str = Query(..., description="Comma-separated country:number pairs, e.g. usa:12025550123,uk:447700900123"),
+    onlinesim_service: OnlinesimService = Depends(get_onlinesim_service),
+):
+    """Последний код подтверждения для каждого номера; статус у каждого номера свой."""
+    items = []
+    for pair in numbers.split(","):
+        country, _, number = pair.strip().partition(":")
+        if not country or not number:
+            raise HTTPException(status_code=400, detail=f"Expected country:number, got {pair.strip()!r}")
+        items.append((country, number))
+    if len(items) > MAX_BATCH_SIZE:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_SIZE} numbers per request")
+    return {"codes": await onlinesim_service.get_codes(items)}
+
+@router.get("/batch", summary="Get numbers for several countries in one request")
+async def get_numbers_batch(
+    countries: str = Query(..., description="Comma-separated countries, e.g. usa,uk,germany"),
+    max_age: int = Query(None, ge=0, description="Only numbers not older than this many seconds"),
+    limit: int = Query(None, ge=1, description="Return at most this many of the freshest numbers per country"),
+    onlinesim_service: OnlinesimService = Depends(get_onlinesim_service),
+):
+    """
+    Номера для нескольких стран: попадания в кэш отдаются сразу, промахи грузятся параллельно.
+
+    Частичный результат: у каждой страны свой status (ok, not_found, unknown_country, unavailable, timeout, overloaded, error).
+    """
+    requested = list(dict.fromkeys(country.strip() for country in countries.split(",") if country.strip()))
+    if not requested:
+        raise HTTPException(status_code=400, detail="No countries given")
+    if len(requested) > MAX_BATCH_SIZE:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_SIZE} countries per request")
+    return {"results": await onlinesim_service.get_numbers_batch(requested, max_age=max_age, limit=limit)}
+
+@router.post("/sms/batch", summary="Get SMS for several numbers in one request")
+async def get_sms_batch(batch: SmsBatchRequest, onlinesim_service: OnlinesimService = Depends(get_onlinesim_service)):
+    """SMS для нескольких номеров; у каждого номера свой status, как в /batch."""
+    items = list(dict.fromkeys((item.country, item.number) for item in batch.items))
+    return {"results": await onlinesim_service.get_sms_batch(items)}
+
 @router.get("/{country}", summary="Get numbers for a specific country and update if missing")
-async def get_country_numbers(country: str):
+async def get_country_numbers(
+    request: Request,
+    country: str,
+    max_age: int = Query(None, ge=0, description="Only numbers not older than this many seconds"),
+    limit: int = Query(None, ge=1, description="Return at most this many of the freshest numbers"),
+    onlinesim_service: OnlinesimService = Depends(get_onlinesim_service),
+):
     """
-    Возвращает номера для указанной страны.
+    Возвращает номера для указанной страны, от самых свежих к самым старым.
     Если данные отсутствуют в кэше, они обновляются.
     """
     try:
-        numbers = await onlinesim_service.get_numbers(country)
+        if max_age is None and limit is None:
+            response = await onlinesim_service.get_numbers_response(country, request.headers)
+            if response is None:
+                raise HTTPException(status_code=404, detail=f"No numbers found for country: {country}")
+            return response
+
+        numbers = await onlinesim_service.get_numbers(country, max_age=max_age, limit=limit)
         if not numbers:
             raise HTTPException(status_code=404, detail=f"No numbers found for country: {country}")
         return {"country": country, "numbers": numbers}
+    except HTTPException:
+        raise
+    except UnknownCountryError:
+        raise HTTPException(status_code=404, detail=f"Unknown country: {country}")
+    except (UpstreamError, AdmissionRejected) as e:
+        raise upstream_unavailable(e)
+    except DeadlineExceeded:
+        raise HTTPException(status_code=504, detail="Upstream did not respond within the request deadline")
     except Exception as e:
         logging.exception(f"Error fetching numbers for country {country}: {e}")
         raise HTTPException(status_code=500, detail="Internal Server Error")
 
 @router.get("/{country}/{number}/sms", summary="Get SMS for a specific number")
-async def get_sms(country: str, number: str):
+async def get_sms(country: str, number: str, onlinesim_service: OnlinesimService = Depends(get_onlinesim_service)):
     try:
         sms = await onlinesim_service.get_sms(country, number)
         if not sms:
             raise HTTPException(status_code=404, detail="No SMS found")
         return {"country": country, "number": number, "sms": sms}
+    except HTTPException:
+        raise
+    except UnknownCountryError:
+        raise HTTPException(status_code=404, detail=f"Unknown country: {country}")
+    except (UpstreamError, AdmissionRejected) as e:
+        raise upstream_unavailable(e)
+    except DeadlineExceeded:
+        raise HTTPException(status_code=504, detail="Upstream did not respond within the request deadline")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/{country}/{number}/code", summary="Get the latest verification code received by a number")
+async def get_code(
+    country: str,
+    number: str,
+    all: bool = Query(False, description="Also return every code found in the latest SMS"),
+    onlinesim_service: OnlinesimService = Depends(get_onlinesim_service),
+):
+    """Код из самого свежего SMS с кодом; code=null, если кода в последних SMS нет."""
+    try:
+        return await onlinesim_service.get_code(country, number, include_all=all)
+    except UnknownCountryError:
+        raise HTTPException(status_code=404, detail=f"Unknown country: {country}")
+    except (UpstreamError, AdmissionRejected) as e:
+        raise upstream_unavailable(e)
+    except DeadlineExceeded:
+        raise HTTPException(status_code=504, detail="Upstream did not respond within the request deadline")
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/{country}/{number}/sms/watch", summary="Stream new SMS for a number (Server-Sent Events)")
+async def watch_sms(
+    request: Request,
+    country: str,
+    number: str,
+    replay: bool = Query(False, description="Send already known messages first"),
+    onlinesim_service: OnlinesimService = Depends(get_onlinesim_service),
+):
+    """
+    Поток новых SMS номера в формате Server-Sent Events (event: sms, data: JSON сообщения).
+
+    Сообщения дедуплицируются по id; все подписчики номера делят один опрос upstream.
+    """
+    try:
+        onlinesim_service.check_country(country)
+    except UnknownCountryError:
+        raise HTTPException(status_code=404, detail=f"Unknown country: {country}")
+
+    config = onlinesim_service.sms_watch.config
+
+    async def events():
+        deadline = asyncio.get_running_loop().time() + config["max_duration"]
+        async with onlinesim_service.sms_watch.subscribe(country, number, replay=replay) as queue:
+            yield ": watching\n\n"
+            while asyncio.get_running_loop().time() < deadline:
+                if await request.is_disconnected():
+                    break
+                try:
+                    message = await asyncio.wait_for(queue.get(), timeout=config["heartbeat"])
+                except asyncio.TimeoutError:
+                    yield ": ping\n\n"
+                    continue
+                yield f"id: {message['id']}\nevent: sms\ndata: {json.dumps(message, ensure_ascii=False)}\n\n"
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -1,12 +1,5 @@
-from aiohttp.web_exceptions import HTTPException
-from fastapi import APIRouter, Request, Form, Query, Body
-import os
-import sys
-project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '../..'))
-if project_root not in sys.path:
-    sys.path.append(project_root)
-from backend.api.services.japanese_name_service import JapaneseNameService
-from backend.api.services.password_service import PasswordService
+from fastapi import APIRouter, Depends, HTTPException, Query
+from backend.api.dependencies import get_japanese_name_service, get_password_service
 
 router = APIRouter()
 
@@ -28,12 +21,13 @@ async def generate_passwords_route(
     use_symbols: bool = Query(False, description="Include symbols"),
     decorate: bool = Query(False, description="Decorate passwords with separators"),
     secret: str = Query("", description="Optional secret for unique variations"),
+    password_service=Depends(get_password_service),
 ):
     """
     Generates random passwords with optional settings.
     """
     try:
-        passwords = PasswordService.generate_passwords(
+        passwords = await password_service.generate_passwords(
             count=count,
             length=length,
             use_uppercase=use_uppercase,
@@ -53,7 +47,8 @@ async def japanese_names_route(
     sex: str = Query("male", pattern="^(male|female)$", description="Gender of names (male or female)"),
 
     firstname_rarity: str = Query("very_rare", description="Rarity of the first name (e.g., common, rare, very_rare)"),
-    lastname_rarity: str = Query("very_rare", description="Rarity of the last name (e.g., common, rare, very_rare)")
+    lastname_rarity: str = Query("very_rare", description="Rarity of the last name (e.g., common, rare, very_rare)"),
+    japanese_name_service=Depends(get_japanese_name_service),
 ):
     """
     Generate Japanese names based on the provided parameters.
@@ -63,7 +58,7 @@ async def japanese_names_route(
     - `firstname_rarity`: Rarity of the first name (default: very_rare).
     - `lastname_rarity`: Rarity of the last name (default: very_rare).
     """
-    names = JapaneseNameService.generate_names(
+    names = await japanese_name_service.generate_names(
         num_names=num_names,
         sex=sex,
         firstname_rarity=firstname_rarity,
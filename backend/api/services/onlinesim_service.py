@@ -1,58 +1,362 @@
 # app/services/onlinesim_service.py
 import os
-import sys
-project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '../..'))
-if project_root not in sys.path:
-    sys.path.append(project_root)
-import aiohttp
 import asyncio
-from backend.api.libs.onlinesim_lib import fetch_fresh_numbers, fetch_last_3_sms, sort_numbers
-
+import uuid
+from bisect import bisect_right
+from collections import deque
+from urllib.parse import urlsplit
+from backend.api.libs.number_index import NumberIndex, project_country
+from backend.api.libs.onlinesim_lib import (
+    CircuitOpenError, CodeExtractor, UpstreamError, fetch_last_3_sms, fetch_numbers_delta,
+)
+from backend.api.utils.adaptive_scheduler import AdaptiveConcurrencyScheduler
+from backend.api.utils.admission import DEFAULT_ADMISSION_CONFIG, AdmissionController, AdmissionRejected
+from backend.api.utils.circuit_breaker import DEFAULT_BACKOFF_CONFIG, CircuitBreakerRegistry, FailureBackoff
+from backend.api.utils.deadline import DeadlineExceeded, UpstreamCallPolicy, without_deadline
+from backend.api.utils.demand_tracker import DEFAULT_DEMAND_CONFIG, DemandTracker
+from backend.api.utils.http_session import create_client_session
+from backend.api.utils.leader_lock import LeaderLock
 from backend.api.utils.logger import logger
+from backend.api.utils.metrics import (
+    CACHE_REQUESTS, REFRESH_SWEEP_COUNTRIES, REFRESH_SWEEP_DURATION, REFRESH_SWEEP_SIZE,
+)
+from backend.api.utils.response_cache import ResponseCache
+from backend.api.utils.single_flight import CoalescingCache, ResultCache, SingleFlight
+from backend.api.utils.sms_watcher import SmsWatchHub
+from backend.api.utils.snapshot import CacheSnapshot
+from backend.api.utils.ttl_cache import DEFAULT_CACHE_CONFIG, FRESH, STALE, SWRCache
+
+DEFAULT_BATCH_CONFIG = {
+    "concurrency": 8,  # Сколько промахов кэша из одного пакетного запроса грузятся из upstream одновременно
+}
+
+
+class UnknownCountryError(KeyError):
+    """Страны нет в конфигурации: запрос отклоняется без обращения к upstream."""
+
+
+class CountryBackoffError(UpstreamError):
+    """Upstream недавно падал для страны, и она на паузе; в кэше отдать нечего. retry_after — когда пробовать снова."""
 
-BATCH_SIZE = 5  # Количество запросов в одном цикле
-WAIT_TIME = 5  # Время ожидания между циклами в секундах
+    fail_fast = True
+
+    def __init__(self, country, retry_after=0.0):
+        super().__init__(country, None, "country backoff")
+        self.retry_after = retry_after
 
 
 class OnlinesimService:
-    def __init__(self, config):
+    def __init__(self, config, session=None):
         self.update_in_progress = False
         self.cache_update_task = None
         self.logging = logger
         self.headers = config["headers"]
         self.urls = config["urls"]
         self.countries = config["countries"]
-        self.number_cache = {}  # Локальный кеш номеров
+        self.known_countries = frozenset(self.countries)  # O(1)-проверка страны до любого сетевого запроса
+        self.http_config = config.get("http", {})
+        self.session = session  # Общий aiohttp.ClientSession на всё время жизни приложения
+        self.owns_session = False
+        self.cache_config = dict(DEFAULT_CACHE_CONFIG)
+        self.cache_config.update(config.get("cache", {}))
+        # Локальный кеш номеров: stale-while-revalidate с временем получения каждой страны
+        self.number_cache = SWRCache(self.cache_config["soft_ttl"], self.cache_config["hard_ttl"])
+        # Одинаковые одновременные запросы к upstream объединяются в один
+        self.flight = SingleFlight()
+        self.sms_cache = CoalescingCache(
+            ttl=self.cache_config["sms_ttl"],
+            ttl_for=lambda sms_list: None if sms_list else self.cache_config["negative_sms_ttl"],
+        )
+        # Пакетные запросы: промахи кэша идут в upstream не больше чем по concurrency одновременно
+        batch_config = dict(DEFAULT_BATCH_CONFIG)
+        batch_config.update(config.get("batch", {}))
+        self.batch_semaphore = asyncio.Semaphore(batch_config["concurrency"])
+        # Коды подтверждения, уже извлечённые из SMS, по id сообщения
+        self.code_extractor = CodeExtractor()
+        # Подписки на новые SMS: один общий опрос upstream на номер, мимо кэша SMS —
+        # иначе опрос чаще sms_ttl/negative_sms_ttl не доходил бы до upstream
+        self.sms_watch = SmsWatchHub(
+            lambda country, number: self.get_sms(country, number, refresh=True), config.get("watch")
+        )
+        # Негативный кэш: страны, для которых upstream недавно вернул пустой список
+        self.negative_cache = ResultCache(ttl=self.cache_config["negative_ttl"])
+        # Последние известные SMS: отдаются, пока upstream недоступен
+        self.sms_fallback = ResultCache(ttl=self.cache_config["sms_fallback_ttl"])
+        # Circuit breaker на upstream-хост и экспоненциальная пауза для падающих стран
+        self.breakers = CircuitBreakerRegistry(config.get("circuit_breaker"))
+        self.breaker = self.breakers.get(urlsplit(self.urls["fetch_numbers_url"]).hostname)
+        backoff_config = dict(DEFAULT_BACKOFF_CONFIG)
+        backoff_config.update(config.get("country_backoff", {}))
+        self.country_backoff = FailureBackoff(**backoff_config)
+        # Спрос по странам: горячие обновляются часто, холодные редко, незапрошенные — лениво
+        demand_config = dict(DEFAULT_DEMAND_CONFIG)
+        demand_config.update(config.get("demand", {}))
+        self.demand = DemandTracker(**demand_config)
+        self.background_tasks = set()
+        snapshot_config = config.get("snapshot", {})
+        self.snapshot = CacheSnapshot(snapshot_config["path"]) if snapshot_config.get("enabled") else None
+        # Общий кэш между воркерами: снимок в SQLite (WAL) + лидер, который один ходит в upstream
+        shared_config = config.get("shared", {})
+        self.leader_lock = None
+        if self.snapshot is not None and shared_config.get("enabled"):
+            self.leader_lock = LeaderLock(shared_config["lock_path"])
+        self.shared_version = 0
+        # fetched_at стран на момент последней записи в снимок: неизменившиеся страны не пишутся повторно
+        self.saved_at = {}
+        # Допуск промахов кэша в upstream: token bucket и ограниченная очередь, дальше — быстрый 503
+        admission_config = dict(DEFAULT_ADMISSION_CONFIG)
+        admission_config.update(config.get("admission", {}))
+        self.admission = AdmissionController(**admission_config)
+        # Повторы и hedging upstream-запросов в пределах дедлайна входящего запроса
+        self.upstream_policy = UpstreamCallPolicy(config.get("deadline"))
+        # AIMD-планировщик вместо фиксированных батчей: сам подбирает конкурентность под upstream
+        self.scheduler = AdaptiveConcurrencyScheduler(config.get("refresh"))
+        self.last_sweep = None
+        # Дельта-обновление: отпечатки ответов upstream и монотонная версия кэша.
+        # Версия своя у каждого процесса и начинается заново после рестарта, поэтому
+        # клиенту отдаётся и эпоха процесса: с версией другой эпохи diff применять нельзя
+        self.fingerprints = {}
+        self.epoch = uuid.uuid4().hex[:12]
+        self.cache_version = 0
+        self.reset_version = 0  # Версия последней массовой загрузки (снимок/общий кэш), diff до неё нет
+        self.changes = deque(maxlen=self.cache_config["changes_history"])
+        # Готовые тела ответов: сериализуются один раз на версию кэша
+        self.responses = ResponseCache(lambda: self.cache_version)
         self.logging.info("OnlinesimService initialized successfully.")
 
-    async def update_cache(self):
-        """Обновляет кэш номеров батчами."""
+    def register_metrics(self, registry):
+        """Метрики состояния сервиса, которые вычисляются в момент сбора /metrics."""
+        breaker_states = {"closed": 0, "half_open": 1, "open": 2}
+        registry.gauge(
+            "numbers_cached_countries", "Countries currently held in the numbers cache",
+            collect=lambda: {(): len(self.number_cache.entries)},
+        )
+        registry.gauge(
+            "numbers_cache_version", "Monotonic version of the numbers cache",
+            collect=lambda: {(): self.cache_version},
+        )
+        registry.gauge(
+            "circuit_breaker_state", "Circuit breaker state per upstream host (0 closed, 1 half-open, 2 open)",
+            ("host",), collect=lambda: {(host,): breaker_states[state] for host, state in self.breakers.states().items()},
+        )
+        registry.gauge(
+            "admission_queue_length", "Requests waiting for an upstream admission token",
+            collect=lambda: {(): len(self.admission.waiters)},
+        )
+        registry.counter(
+            "admission_requests_total", "Upstream admission decisions", ("result",),
+            collect=lambda: {(result,): count for result, count in self.admission.counters.items()},
+        )
+        registry.counter(
+            "upstream_call_events_total", "Upstream call policy events (retries, hedged requests, deadlines)",
+            ("event",), collect=lambda: {(event,): count for event, count in self.upstream_policy.counters.items()},
+        )
+        registry.gauge(
+            "sms_watch_subscribers", "Clients subscribed to SMS watch streams",
+            collect=lambda: {(): self.sms_watch.stats()["subscribers"]},
+        )
+        registry.gauge(
+            "update_in_progress", "1 while a numbers refresh sweep is running",
+            collect=lambda: {(): int(self.update_in_progress)},
+        )
+
+    def attach_session(self, session):
+        """Подключает внешний (общий) ClientSession, созданный в lifespan."""
+        self.session = session
+        self.owns_session = False
+
+    def get_session(self):
+        """Возвращает общий ClientSession, создавая собственный, если его не передали."""
+        if self.session is None or self.session.closed:
+            self.logging.warning("No shared HTTP session attached. Creating a service-owned one.")
+            self.session = create_client_session(self.http_config)
+            self.owns_session = True
+        return self.session
+
+    async def close(self):
+        """Останавливает опросы подписок и закрывает ClientSession, если сервис создал его сам."""
+        await self.sms_watch.close()
+        if self.owns_session and self.session is not None and not self.session.closed:
+            await self.session.close()
+        self.session = None
+        self.owns_session = False
+
+    @property
+    def is_leader(self):
+        return self.leader_lock is None or self.leader_lock.is_leader
+
+    def acquire_leadership(self):
+        """Пытается стать лидером-обновлятором. Без общего кэша каждый процесс — лидер."""
+        if self.leader_lock is None:
+            return True
+        was_leader = self.leader_lock.is_leader
+        if self.leader_lock.try_acquire() and not was_leader:
+            self.logging.info(f"Worker {os.getpid()} became cache refresh leader.")
+        return self.leader_lock.is_leader
+
+    def release_leadership(self):
+        if self.leader_lock is not None:
+            self.leader_lock.release()
+
+    async def sync_shared_cache(self):
+        """
+        Подтягивает данные, записанные другими воркерами в общий кэш, если версия изменилась.
+
+        Нужен и лидеру: последователь при промахе сам загружает страну и пишет её в снимок,
+        и без синхронизации лидер не знал бы о ней и не обновлял бы её по расписанию.
+        """
+        if self.snapshot is None:
+            return False
+        try:
+            version = await asyncio.to_thread(self.snapshot.version)
+            if version == self.shared_version:
+                return False
+            entries, elapsed = await asyncio.to_thread(self.snapshot.load)
+        except Exception as e:
+            self.logging.exception(f"Failed to sync shared cache: {e}")
+            return False
+        replaced = self.number_cache.load(self.indexes_from_rows(entries))
+        self.saved_at.update((country, fetched_at) for country, (_, fetched_at) in entries.items())
+        self.shared_version = version
+        # Лидер мог лишь отметить страны свежими: версию (и ETag) меняем, только если изменились номера
+        changed = [country for country, previous in replaced.items() if previous != self.number_cache.entries[country].value]
+        if not changed:
+            return False
+        self.bump_version(reset=True)
+        self.logging.info(
+            f"Shared cache synced to version {version}: {len(changed)} of {len(entries)} countries changed "
+            f"in {elapsed * 1000:.1f} ms."
+        )
+        return True
+
+    async def share_demand(self):
+        """
+        Сбрасывает спрос этого воркера в общий снимок; лидер затем загружает суммарный спрос.
+
+        Иначе лидер планировал бы обновления только по запросам, пришедшим к нему самому,
+        то есть примерно по 1/N реального спроса.
+        """
+        if self.snapshot is None or self.leader_lock is None:
+            return
+        pending = self.demand.take_pending()
+        try:
+            if pending:
+                await asyncio.to_thread(self.snapshot.add_demand, pending, self.demand.decay_rate)
+            if self.is_leader:
+                self.demand.load_shared(await asyncio.to_thread(self.snapshot.load_demand))
+        except Exception as e:
+            self.demand.restore_pending(pending)
+            self.logging.exception(f"Failed to share demand: {e}")
+
+    def bump_version(self, reset=False):
+        self.cache_version += 1
+        if reset:
+            self.reset_version = self.cache_version
+        return self.cache_version
+
+    def fingerprint_for(self, country):
+        """Отпечаток прошлого ответа, если данные страны ещё в кэше."""
+        fingerprint = self.fingerprints.get(country)
+        if fingerprint is None or country not in self.number_cache:
+            return None
+        return fingerprint
+
+    def apply_numbers(self, country, numbers, fingerprint):
+        """
+        Применяет результат дельта-запроса к кэшу.
+
+        Неизменившиеся страны только помечаются свежими; для изменившихся записывается
+        diff добавленных и удалённых номеров и увеличивается версия кэша.
+        Возвращает True, если данные страны изменились.
+        """
+        if fingerprint is not None:
+            self.fingerprints[country] = fingerprint
+        if numbers is None:
+            self.number_cache.touch(country)
+            return False
+        if not numbers:
+            return False
+
+        index = NumberIndex.from_numbers(numbers, country)
+        previous = self.number_cache.entries.get(country)
+        old_numbers = set(previous.value.full_numbers) if previous else set()
+        new_numbers = set(index.full_numbers)
+        self.number_cache.set(country, index)
+        version = self.bump_version()
+        self.changes.append({
+            "version": version,
+            "country": country,
+            "added": sorted(new_numbers - old_numbers),
+            "removed": sorted(old_numbers - new_numbers),
+        })
+        return True
+
+    def get_changes(self, since=0, epoch=None):
+        """
+        Изменения кэша после версии since.
+
+        full_reload=True означает, что часть данных загружена целиком (из снимка или
+        общего кэша) либо версия since получена от другого процесса (epoch не совпадает,
+        версия больше текущей) — клиенту нужно перечитать страны, а не применять diff.
+        """
+        oldest = self.changes[0]["version"] if self.changes else self.cache_version + 1
+        foreign = (epoch is not None and epoch != self.epoch) or since > self.cache_version
+        return {
+            "epoch": self.epoch,
+            "version": self.cache_version,
+            "full_reload": foreign or since < self.reset_version or since < oldest - 1,
+            "changes": [] if foreign else [change for change in self.changes if change["version"] > since],
+        }
+
+    async def update_cache(self, countries=None):
+        """Обновляет кэш номеров (все страны или только переданные) с адаптивной конкурентностью."""
         if self.update_in_progress:
             self.logging.info("Cache update already in progress.")
             return
+        if not self.is_leader:
+            self.logging.info("Cache update skipped: another worker is the refresh leader.")
+            return
+
+        if self.breaker.is_open:
+            self.logging.warning(f"Cache update skipped: circuit for {self.breaker.name} is open.")
+            return
 
         self.update_in_progress = True
         try:
-            async with aiohttp.ClientSession() as session:
-                # Обрабатываем страны батчами
-                for i in range(0, len(self.countries), BATCH_SIZE):
-                    batch_countries = self.countries[i:i + BATCH_SIZE]
-
-                    tasks = [
-                        fetch_fresh_numbers(session, country, self.headers, self.urls, show_all=False)
-                        for country in batch_countries
-                    ]
+            session = self.get_session()
+            # Страны, которые недавно падали, пропускаем до истечения их паузы
+            due = [country for country in countries or self.countries if not self.country_backoff.is_blocked(country)]
 
-                    results = await asyncio.gather(*tasks)
-                    for country, numbers in zip(batch_countries, results):
-                        if numbers:
-                            self.number_cache[country] = sort_numbers(numbers)
+            async def fetch_country(country):
+                return await fetch_numbers_delta(
+                    session, country, self.headers, self.urls,
+                    fingerprint=self.fingerprint_for(country), raise_errors=True,
+                    breaker=self.breaker,
+                )
 
-                    self.logging.info(f"Cache updated for batch: {batch_countries}")
+            results, report = await self.scheduler.run(due, fetch_country)
+            changed = 0
+            for country, result in results.items():
+                if isinstance(result, Exception):
+                    if not getattr(result, "fail_fast", False):
+                        self.country_backoff.record_failure(country)
+                    continue
+                self.country_backoff.record_success(country)
+                numbers, fingerprint = result
+                changed += self.apply_numbers(country, numbers, fingerprint)
 
-                    if i + BATCH_SIZE < len(self.countries):
-                        self.logging.info(f"Waiting {WAIT_TIME} seconds before next batch...")
-                        await asyncio.sleep(WAIT_TIME)
+            report["changed"] = changed
+            self.last_sweep = report
+            REFRESH_SWEEP_DURATION.observe(report["duration"])
+            REFRESH_SWEEP_SIZE.set(len(results))
+            REFRESH_SWEEP_COUNTRIES.inc("ok", amount=len(results) - report["failed"])
+            REFRESH_SWEEP_COUNTRIES.inc("failed", amount=report["failed"])
+            REFRESH_SWEEP_COUNTRIES.inc("changed", amount=changed)
+            self.logging.info(
+                f"Cache updated: {len(results) - report['failed']}/{len(results)} countries "
+                f"({changed} changed) in {report['duration']}s at concurrency {report['concurrency']}, "
+                f"version {self.cache_version}."
+            )
 
         except Exception as e:
             self.logging.exception(f"Error updating cache: {e}")
@@ -60,45 +364,464 @@ class OnlinesimService:
         finally:
             self.update_in_progress = False
 
+    def due_countries(self):
+        """
+        Страны, которым пора обновиться по их спросу.
+
+        Интервал каждой страны задаёт DemandTracker; никем не запрошенные страны
+        фоном не обновляются и загружаются лениво при первом запросе.
+        """
+        margin = self.cache_config["refresh_margin"]
+        due = []
+        for country, entry in list(self.number_cache.entries.items()):
+            interval = self.demand.refresh_interval(country)
+            if interval is not None and entry.age() >= interval - margin:
+                due.append(country)
+        # Самые популярные страны обновляем первыми
+        due.sort(key=self.demand.score, reverse=True)
+        return due
+
+    async def refresh_expiring(self):
+        """Обновляет только те страны, которым пора обновиться с учётом их популярности."""
+        due = self.due_countries()
+        if not due:
+            self.logging.info("No cached countries due for refresh.")
+            return
+        self.logging.info(f"Refreshing {len(due)} countries due by demand.")
+        await self.update_cache(due)
+
+    async def leader_tick(self):
+        """
+        Плановый цикл лидера: спрос всех воркеров и загруженные ими страны из общего снимка,
+        затем обновление стран, которым пора, и запись результата в снимок.
+        """
+        await self.share_demand()
+        await self.sync_shared_cache()
+        await self.refresh_expiring()
+        await self.save_snapshot()
+
+    async def refresh_stale(self):
+        """Обновляет все страны, которые устарели или скоро устареют по soft TTL."""
+        expiring = self.number_cache.expiring(self.cache_config["refresh_margin"])
+        if not expiring:
+            self.logging.info("No cached countries near expiry.")
+            return
+        self.logging.info(f"Refreshing {len(expiring)} countries near expiry.")
+        await self.update_cache(expiring)
+
+    def load_snapshot(self):
+        """Загружает снимок кэша с диска, чтобы сервис был «тёплым» сразу после старта."""
+        if self.snapshot is None:
+            return 0
+        try:
+            entries, elapsed = self.snapshot.load()
+        except Exception as e:
+            self.logging.exception(f"Failed to load cache snapshot: {e}")
+            return 0
+        self.number_cache.load(self.indexes_from_rows(entries))
+        self.saved_at = {country: fetched_at for country, (_, fetched_at) in entries.items()}
+        self.shared_version = self.snapshot.version()
+        self.bump_version(reset=True)
+        self.logging.info(
+            f"Cache snapshot loaded: {len(entries)} countries, {self.snapshot.size()} bytes "
+            f"in {elapsed * 1000:.1f} ms from {self.snapshot.path}."
+        )
+        return len(entries)
+
+    @staticmethod
+    def indexes_from_rows(entries):
+        """Преобразует строки снимка {country: (numbers, fetched_at)} в индексы номеров."""
+        return {
+            country: (NumberIndex.from_numbers(numbers, country), fetched_at)
+            for country, (numbers, fetched_at) in entries.items()
+        }
+
+    async def save_snapshot(self, countries=None):
+        """Сохраняет кэш (или только переданные страны) на диск в отдельном потоке, не блокируя event loop."""
+        if self.snapshot is None or not self.number_cache:
+            return
+        if countries is None and not self.is_leader:
+            return  # Полный снимок пишет только лидер, иначе можно затереть более свежие данные
+        entries = self.number_cache.dump()
+        if countries is not None:
+            entries = {country: entries[country] for country in countries if country in entries}
+        # Пишем только страны, которые обновились с прошлого сохранения: иначе каждый тик
+        # поднимал бы версию снимка и заставлял последователей перечитывать кэш
+        entries = {
+            country: (index.to_list(), fetched_at)
+            for country, (index, fetched_at) in entries.items()
+            if self.saved_at.get(country) != fetched_at
+        }
+        if not entries:
+            return
+        try:
+            rows, size = await asyncio.to_thread(self.snapshot.save, entries)
+            self.saved_at.update((country, fetched_at) for country, (_, fetched_at) in entries.items())
+            self.logging.info(f"Cache snapshot saved: {rows} of {len(entries)} countries written, {size} bytes.")
+        except Exception as e:
+            self.logging.exception(f"Failed to save cache snapshot: {e}")
+
+    async def reconcile(self):
+        """Сверяет кэш (в том числе загруженный из снимка) с upstream после старта."""
+        if not self.is_leader:
+            await self.sync_shared_cache()
+            return
+        if self.number_cache:
+            await self.refresh_stale()
+        else:
+            await self.update_cache()
+        await self.save_snapshot()
+
+    async def refresh_country(self, country: str):
+        """Обновляет страну через single-flight: одновременные вызовы делят один запрос."""
+        await self.flight.do(("numbers", country, None), lambda: self.update_country_cache(country))
+
+    def revalidate_in_background(self, country: str):
+        """Запускает фоновое обновление страны, если оно ещё не запущено."""
+        if self.is_leader:
+            if self.flight.is_running(("numbers", country, None)) or self.upstream_blocked(country):
+                return
+            task = asyncio.create_task(without_deadline(self.refresh_country(country)))
+        else:
+            # Воркер-последователь не ходит в upstream, а перечитывает общий кэш
+            if self.flight.is_running(("sync", None, None)):
+                return
+            task = asyncio.create_task(without_deadline(self.flight.do(("sync", None, None), self.sync_shared_cache)))
+        self.background_tasks.add(task)
+        task.add_done_callback(self.background_tasks.discard)
+
+    async def ensure_cache(self):
+        """
+        Заполняет пустой кеш полным обновлением (если оно ещё не идёт).
+
+        Sweep общий для всех ожидающих и идёт в фоне до конца, а запрос ждёт его не дольше
+        своего дедлайна; после дедлайна отдаётся то, что sweep уже успел загрузить.
+        """
+        key = ("sweep", None, None)
+        if self.number_cache or (self.update_in_progress and not self.flight.is_running(key)):
+            return
+        try:
+            # Sweep не проверяет дедлайн, но и общий дедлайн ожидающих на него не распространяем
+            await self.flight.do(key, lambda: without_deadline(self.update_cache()))
+        except DeadlineExceeded:
+            self.logging.info("Cache fill is still running; serving %d cached countries", len(self.number_cache))
+
     async def get_cache(self):
         """Возвращает актуальный кеш."""
-        if not self.number_cache and not self.update_in_progress:
-            await self.update_cache()
-        return self.number_cache
+        await self.ensure_cache()
+        return {country: index.to_list() for country, index in self.number_cache.items()}
+
+    async def get_cache_response(self, request_headers):
+        """Весь кеш {"countries": {...}} как готовый (сжатый, с ETag) ответ."""
+        await self.ensure_cache()
+        live = self.number_cache.items()
+        # Записи старше hard_ttl выпадают из items() без смены версии кэша, поэтому набор
+        # живых стран входит в ключ: иначе листинг отдавал бы истёкшие страны под старым ETag
+        return self.responses.respond(
+            request_headers,
+            ("countries", frozenset(country for country, _ in live)),
+            lambda: {"countries": {country: index.to_list() for country, index in live}},
+        )
+
+    async def get_numbers_response(self, country: str, request_headers):
+        """Номера страны как готовый ответ или None, если номеров нет."""
+        index = await self.get_number_index(country)
+        if not index:
+            return None
+        return self.responses.respond(
+            request_headers,
+            ("country", country),
+            lambda: {"country": country, "numbers": index.to_list()},
+        )
+
+    def page_countries(self, cursor=None, limit=None):
+        """Страны страницы в алфавитном порядке и признак, что за ней есть ещё страны."""
+        countries = sorted(country for country, _ in self.number_cache.items())
+        start = bisect_right(countries, cursor) if cursor else 0
+        end = len(countries) if limit is None else min(len(countries), start + limit)
+        return countries[start:end], end < len(countries)
+
+    def iter_countries(self, cursor=None, limit=None, fields=None):
+        """
+        Лениво отдаёт страны страницы по одной с учётом проекции (см. project_country).
+
+        Страница и её индексы выбираются сразу, на event loop: StreamingResponse перебирает
+        синхронный генератор в пуле потоков, а кэш в это время меняется. Сами NumberIndex
+        неизменяемы, поэтому проекцию можно строить уже вне event loop.
+        """
+        page, _ = self.page_countries(cursor, limit)
+        rows = []
+        for country in page:
+            index = self.number_cache.get(country)
+            if index is not None:
+                rows.append((country, index, self.number_cache.fetched_at(country)))
+        return (project_country(country, index, fetched_at, fields) for country, index, fetched_at in rows)
+
+    def list_countries(self, cursor=None, limit=None, fields=None):
+        """
+        Страница стран из кэша: cursor — страна, после которой начинается страница.
+
+        Возвращает (items, next_cursor); next_cursor равен None на последней странице.
+        """
+        page, has_more = self.page_countries(cursor, limit)
+        items = list(self.iter_countries(cursor, limit, fields))
+        next_cursor = page[-1] if page and has_more else None
+        return items, next_cursor
 
     async def get_fresh_countries(self):
         """Возвращает страны с актуальными номерами из кэша."""
         if not self.number_cache:
             self.logging.info("Cache is empty. Triggering update...")
-            asyncio.create_task(self.update_cache())
-        return [{"country": country, "numbers": numbers} for country, numbers in self.number_cache.items()]
+            asyncio.create_task(without_deadline(self.update_cache()))
+        return [{"country": country, "numbers": index.to_list()} for country, index in self.number_cache.items()]
 
     async def update_country_cache(self, country: str):
         """Обновляет кэш для указанной страны."""
         try:
-            async with aiohttp.ClientSession() as session:
-                fresh_numbers = await fetch_fresh_numbers(session, country, self.headers, self.urls, show_all=True)
-
-                if fresh_numbers:
-                    self.number_cache[country] = sort_numbers(fresh_numbers)
-                    self.logging.info(f"Cache updated for country: {country}")
-                else:
-                    self.logging.warning(f"No numbers fetched for country: {country}")
+            fresh_numbers, fingerprint = await fetch_numbers_delta(
+                self.get_session(), country, self.headers, self.urls,
+                fingerprint=self.fingerprint_for(country), raise_errors=True,
+                breaker=self.breaker, policy=self.upstream_policy,
+            )
+            self.country_backoff.record_success(country)
+
+            if fresh_numbers is None:
+                self.apply_numbers(country, None, fingerprint)
+                self.logging.debug("Cache unchanged for country: %s", country)
+            elif fresh_numbers:
+                self.apply_numbers(country, fresh_numbers, fingerprint)
+                self.logging.debug("Cache updated for country: %s", country)
+                # Пишем сразу в общий кэш, чтобы остальные воркеры не запрашивали страну повторно
+                await self.save_snapshot([country])
+            else:
+                self.negative_cache.set(("numbers", country), True)
+                self.logging.warning("No numbers fetched for country: %s", country)
+        except UpstreamError as e:
+            if not e.fail_fast:
+                delay = self.country_backoff.record_failure(country)
+                self.logging.warning("Upstream failed for country %s, backing off ~%ss: %s", country, delay, e)
+            # Без данных в кэше отказ upstream нельзя выдавать за пустой ответ
+            if self.number_cache.peek(country) is None:
+                raise
+        except DeadlineExceeded:
+            # Не вина upstream: кончился бюджет запроса, страну на паузу не ставим
+            self.logging.warning("Deadline exceeded while updating country %s", country)
+            raise
         except Exception as e:
             self.logging.exception(f"Error updating cache for country {country}: {e}")
 
-    async def get_numbers(self, country: str):
-        """Fetch numbers for a specific country from cache or update it."""
-        if country not in self.number_cache:
-            self.logging.info(f"Cache miss for country: {country}. Updating cache...")
-            await self.update_country_cache(country)
-        return self.number_cache.get(country, [])
-
-    async def get_sms(self, country: str, number: str):
-        """Получает последние 3 SMS для указанного номера."""
-        async with aiohttp.ClientSession() as session:
-            sms_list = await fetch_last_3_sms(session, country, number, self.headers, self.urls)
+    def upstream_blocked(self, country: str):
+        """True, если сейчас в upstream за страной ходить не стоит: цепь открыта или страна на паузе."""
+        return self.breaker.is_open or self.country_backoff.is_blocked(country)
+
+    def check_country(self, country: str):
+        """Отклоняет неизвестную страну (например, опечатку /numbers/usaa) до любого сетевого запроса."""
+        if country not in self.known_countries:
+            raise UnknownCountryError(country)
+
+    async def get_number_index(self, country: str):
+        """Возвращает NumberIndex страны из кэша, обновляя его при необходимости (или None)."""
+        self.check_country(country)
+        self.demand.record(country)
+        index, state = self.number_cache.lookup(country)
+        if state == FRESH:
+            CACHE_REQUESTS.inc("numbers", "fresh")
+            return index
+        if state == STALE:
+            # Отдаём устаревшие данные сразу, обновляем в фоне
+            CACHE_REQUESTS.inc("numbers", "stale")
+            self.revalidate_in_background(country)
+            return index
+        if self.negative_cache.get(("numbers", country))[0]:
+            CACHE_REQUESTS.inc("numbers", "negative")
+            return None  # Недавно выяснили, что номеров нет — отвечаем из памяти
+        CACHE_REQUESTS.inc("numbers", "miss")
+        if self.snapshot is not None:
+            # Страну мог уже загрузить другой воркер: сначала общий кэш, потом upstream
+            await self.flight.do(("sync", None, None), self.sync_shared_cache)
+            index = self.number_cache.get(country)
+            if index is not None:
+                return index
+        if self.upstream_blocked(country):
+            # Upstream недоступен: сразу отдаём что есть, даже старше hard TTL, не дожидаясь таймаутов
+            index = self.number_cache.peek(country)
+            if index is None and self.breaker.is_open:
+                raise CircuitOpenError(self.breaker.name, self.breaker.retry_after())
+            if index is None:
+                raise CountryBackoffError(country, self.country_backoff.retry_in(country))
+            return index
+        self.logging.debug("Cache %s for country: %s. Updating cache...", state, country)
+        try:
+            if not self.flight.is_running(("numbers", country, None)):
+                # Присоединиться к уже идущему запросу бесплатно; новый запрос в upstream — только по токену
+                await self.admission.acquire()
+            await self.refresh_country(country)
+        except (DeadlineExceeded, AdmissionRejected, UpstreamError):
+            # Upstream не успел в бюджет запроса, перегружен или упал: лучше отдать устаревшие данные, чем ничего
+            index = self.number_cache.peek(country)
+            if index is None:
+                raise
+            return index
+        return self.number_cache.get(country)
+
+    async def get_numbers(self, country: str, max_age=None, limit=None):
+        """Fetch numbers for a specific country from cache or update it.
+
+        max_age — максимальный возраст номера в секундах, limit — сколько самых свежих номеров вернуть.
+        """
+        index = await self.get_number_index(country)
+        if index is None:
+            return []
+        return index.query(max_age=max_age, limit=limit)
+
+    async def get_sms(self, country: str, number: str, refresh: bool = False):
+        """
+        Получает последние 3 SMS для указанного номера.
+
+        refresh=True — не брать результат из кэша SMS, а запросить upstream (с обновлением кэша).
+        """
+        self.check_country(country)
+        key = ("sms", country, number)
+        self.demand.record(country)
+        if self.breaker.is_open:
+            hit, sms_list = self.sms_fallback.get(key)
+            if hit:
+                return sms_list
+            raise CircuitOpenError(self.breaker.name, self.breaker.retry_after())
+
+        async def load():
+            try:
+                sms_list = await fetch_last_3_sms(
+                    self.get_session(), country, number, self.headers, self.urls,
+                    raise_errors=True, breaker=self.breaker, policy=self.upstream_policy,
+                )
+            except DeadlineExceeded:
+                hit, sms_list = self.sms_fallback.get(key)
+                if hit:
+                    return sms_list
+                raise
+            except UpstreamError:
+                hit, sms_list = self.sms_fallback.get(key)
+                if hit:
+                    return sms_list
+                # Ошибка не кэшируется: в кэш SMS попадают только настоящие ответы upstream
+                raise
+            self.sms_fallback.set(key, sms_list)
             return sms_list
 
+        cached = not refresh and self.sms_cached(country, number)
+        CACHE_REQUESTS.inc("sms", "hit" if cached else "miss")
+        if not cached and not self.sms_cache.flight.is_running(key):
+            try:
+                await self.admission.acquire()
+            except AdmissionRejected:
+                hit, sms_list = self.sms_fallback.get(key)
+                if hit:
+                    return sms_list
+                raise
+        return await self.sms_cache.get(key, load, refresh=refresh)
+
+    async def get_code(self, country: str, number: str, include_all: bool = False):
+        """
+        Последний код подтверждения, пришедший на номер.
+
+        Возвращает code=None, если в последних SMS кода нет; include_all добавляет все найденные коды.
+        """
+        sms_list = await self.get_sms(country, number)
+        codes = self.code_extractor.codes_for(sms_list)
+        latest = codes[0] if codes else {"id": None, "code": None, "time": None}
+        result = {"country": country, "number": number, **latest}
+        if include_all:
+            result["codes"] = codes
+        return result
+
+    async def get_codes(self, items):
+        """Коды для нескольких номеров сразу; items — пары (country, number)."""
+        results = await self.run_batch(
+            items,
+            lambda item: self.get_code(*item),
+            lambda item: self.sms_cached(*item),
+        )
+        return [
+            {"status": status, **(result or {"country": country, "number": number, "code": None})}
+            for (country, number), (status, result) in zip(items, results)
+        ]
+
+    def numbers_cached(self, country):
+        """Ответ по стране будет отдан из памяти, без запроса к upstream."""
+        if country not in self.known_countries:
+            return True
+        _, state = self.number_cache.lookup(country)
+        return state in (FRESH, STALE) or self.negative_cache.get(("numbers", country))[0]
+
+    def sms_cached(self, country, number):
+        return country not in self.known_countries or self.sms_cache.results.get(("sms", country, number))[0]
+
+    async def run_batch(self, items, fn, is_cached):
+        """
+        Выполняет fn(item) для всех элементов пакета и возвращает список (status, result).
+
+        Попадания в кэш отдаются сразу, промахи грузятся параллельно, но не больше
+        batch_semaphore одновременно. Ошибка одного элемента не роняет весь пакет:
+        status — "ok", "unknown_country", "unavailable",
+        "timeout", "overloaded" или "error".
+        """
+        async def run(item):
+            if is_cached(item):
+                return await fn(item)
+            async with self.batch_semaphore:
+                return await fn(item)
+
+        results = await asyncio.gather(*(run(item) for item in items), return_exceptions=True)
+        statuses = []
+        for item, result in zip(items, results):
+            if not isinstance(result, BaseException):
+                statuses.append(("ok", result))
+            elif isinstance(result, UnknownCountryError):
+                statuses.append(("unknown_country", None))
+            elif isinstance(result, UpstreamError):
+                statuses.append(("unavailable", None))
+            elif isinstance(result, DeadlineExceeded):
+                statuses.append(("timeout", None))
+            elif isinstance(result, AdmissionRejected):
+                statuses.append(("overloaded", None))
+            elif isinstance(result, Exception):
+                self.logging.error("Batch item %r failed: %r", item, result)
+                statuses.append(("error", None))
+            else:
+                raise result
+        return statuses
 
+    async def get_numbers_batch(self, countries, max_age=None, limit=None):
+        """Номера для нескольких стран за один запрос; у каждой страны свой status."""
+        results = await self.run_batch(
+            countries,
+            lambda country: self.get_numbers(country, max_age=max_age, limit=limit),
+            self.numbers_cached,
+        )
+        response = []
+        for country, (status, numbers) in zip(countries, results):
+            if status == "ok" and not numbers:
+                status = "not_found"
+            item = {"country": country, "status": status}
+            if status == "ok":
+                item["numbers"] = numbers
+            response.append(item)
+        return response
 
+    async def get_sms_batch(self, items):
+        """SMS для нескольких номеров за один запрос; items — пары (country, number)."""
+        results = await self.run_batch(
+            items,
+            lambda item: self.get_sms(*item),
+            lambda item: self.sms_cached(*item),
+        )
+        response = []
+        for (country, number), (status, sms) in zip(items, results):
+            if status == "ok" and not sms:
+                status = "not_found"
+            item = {"country": country, "number": number, "status": status}
+            if status == "ok":
+                item["sms"] = sms
+            response.append(item)
+        return response
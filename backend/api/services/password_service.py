@@ -1,16 +1,15 @@
-import os
-import sys
-project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '../..'))
-if project_root not in sys.path:
-    sys.path.append(project_root)
 from backend.api.libs.generate_passwords import generate_passwords
+from backend.api.utils.profiling import timed
 
 
 class PasswordService:
     used_passwords = set()
 
-    @staticmethod
-    def generate_passwords(
+    def __init__(self, executors):
+        self.executors = executors
+
+    async def generate_passwords(
+        self,
         count: int = 1,
         length: int = 8,
         use_uppercase: bool = False,
@@ -32,11 +31,16 @@ class PasswordService:
         :param decorate: Add decorative separators (e.g., hyphens)
         :param secret: Additional secret phrase for unique variation
         :return: List of generated passwords
+
+        Недостающие пароли генерируются пачкой: крупные пачки — в пуле процессов, чтобы не
+        держать event loop, мелкие — на месте. Уникальность проверяется здесь, в родительском
+        процессе, потому что used_passwords у дочерних процессов свой.
         """
         passwords = []
         while len(passwords) < count:
-            password = generate_passwords(
-                num_passwords=1,
+            missing = count - len(passwords)
+            options = dict(
+                num_passwords=missing,
                 length=length,
                 use_uppercase=int(use_uppercase),
                 use_lowercase=int(use_lowercase),
@@ -44,9 +48,15 @@ class PasswordService:
                 use_symbols=int(use_symbols),
                 secret=secret,
                 decorate=decorate,
-            )[0]
-            if password not in PasswordService.used_passwords:
-                passwords.append(password)
-                PasswordService.used_passwords.add(password)
+            )
+            with timed("generate"):
+                if missing * length >= self.executors.cpu_offload_min_chars:
+                    batch = await self.executors.run_cpu(generate_passwords, **options)
+                else:
+                    batch = generate_passwords(**options)
+            for password in batch:
+                if password not in PasswordService.used_passwords:
+                    passwords.append(password)
+                    PasswordService.used_passwords.add(password)
         return passwords
 
@@ -0,0 +1,122 @@
+# app/utils/adaptive_scheduler.py
+import asyncio
+import time
+from backend.api.utils.logger import logger
+
+# Статусы upstream, означающие перегрузку: на них сразу снижаем конкурентность
+OVERLOAD_STATUSES = {429, 500, 502, 503, 504}
+
+DEFAULT_SCHEDULER_CONFIG = {
+    "initial_concurrency": 4,   # С какой конкурентности начинаем sweep
+    "min_concurrency": 1,
+    "max_concurrency": 16,
+    "target_latency": 2.0,      # Выше этой задержки (сек) считаем, что upstream не справляется
+    "increase_step": 1,         # Аддитивное увеличение после окна успешных запросов
+    "decrease_factor": 0.5,     # Мультипликативное уменьшение при ошибке или медленном ответе
+    "cooldown": 2.0,            # Пауза (сек) перед новыми запросами после перегрузки
+}
+
+
+class AdaptiveConcurrencyScheduler:
+    """
+    AIMD-планировщик для обновления кэша.
+
+    Пока задержка и ошибки в норме, лимит одновременных запросов растёт на increase_step
+    после каждого окна из `limit` успешных ответов. При ошибке перегрузки (429/5xx, таймаут)
+    или задержке выше target_latency лимит умножается на decrease_factor.
+    """
+
+    def __init__(self, config=None):
+        self.logging = logger
+        self.config = dict(DEFAULT_SCHEDULER_CONFIG)
+        self.config.update(config or {})
+        self.min_concurrency = self.config["min_concurrency"]
+        self.max_concurrency = self.config["max_concurrency"]
+        self.limit = float(self.config["initial_concurrency"])
+        self.last_report = None
+        self._window_successes = 0
+        self._cooldown_until = 0.0
+
+    @property
+    def concurrency(self):
+        return max(self.min_concurrency, min(self.max_concurrency, int(self.limit)))
+
+    def on_success(self, latency):
+        if latency > self.config["target_latency"]:
+            self._decrease(f"slow response {latency:.2f}s")
+            return
+        self._window_successes += 1
+        if self._window_successes >= self.concurrency:
+            self._window_successes = 0
+            self.limit = min(self.max_concurrency, self.limit + self.config["increase_step"])
+
+    def on_failure(self, error):
+        if getattr(error, "fail_fast", False):
+            return  # Запрос не уходил в upstream (например, открыт circuit breaker)
+        status = getattr(error, "status", None)
+        if status is None or status in OVERLOAD_STATUSES:
+            self._decrease(f"upstream error {status or type(error).__name__}")
+            self._cooldown_until = time.monotonic() + self.config["cooldown"]
+
+    def _decrease(self, reason):
+        self._window_successes = 0
+        self.limit = max(self.min_concurrency, self.limit * self.config["decrease_factor"])
+        self.logging.info(f"Scheduler: backing off to concurrency {self.concurrency} ({reason}).")
+
+    async def run(self, items, worker):
+        """
+        Выполняет worker(item) для всех items, подстраивая конкурентность под upstream.
+
+        Возвращает (results, report): results — словарь item -> результат (или исключение),
+        report — длительность sweep и итоговый уровень конкурентности.
+        """
+        started = time.monotonic()
+        pending = list(items)
+        pending.reverse()
+        in_flight = {}
+        results = {}
+        failed = 0
+        peak = self.concurrency
+
+        try:
+            while pending or in_flight:
+                delay = self._cooldown_until - time.monotonic()
+                if delay > 0 and pending:
+                    if not in_flight:
+                        await asyncio.sleep(delay)
+                        continue
+                else:
+                    while pending and len(in_flight) < self.concurrency:
+                        item = pending.pop()
+                        task = asyncio.create_task(worker(item))
+                        in_flight[task] = (item, time.monotonic())
+                    peak = max(peak, len(in_flight))
+
+                timeout = delay if delay > 0 and pending else None
+                done, _ = await asyncio.wait(in_flight, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    item, task_started = in_flight.pop(task)
+                    error = task.exception()
+                    if error is None:
+                        results[item] = task.result()
+                        self.on_success(time.monotonic() - task_started)
+                    else:
+                        results[item] = error
+                        failed += 1
+                        self.on_failure(error)
+        finally:
+            for task in in_flight:
+                task.cancel()
+
+        self.last_report = {
+            "duration": round(time.monotonic() - started, 3),
+            "items": len(results),
+            "failed": failed,
+            "concurrency": self.concurrency,
+            "peak_concurrency": peak,
+        }
+        self.logging.info(
+            f"Scheduler: sweep of {len(results)} items finished in {self.last_report['duration']}s, "
+            f"failed={failed}, concurrency={self.concurrency}, peak={peak}."
+        )
+        return results, self.last_report
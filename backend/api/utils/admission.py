@@ -0,0 +1,115 @@
+# app/utils/admission.py
+import asyncio
+import time
+from collections import deque
+from backend.api.utils.deadline import remaining
+from backend.api.utils.profiling import timed
+
+DEFAULT_ADMISSION_CONFIG = {
+    "rate": 20.0,      # Сколько запросов в секунду можно отправить в upstream из обработчиков
+    "burst": 40,       # Ёмкость token bucket: сколько запросов можно отправить разом
+    "max_queue": 100,  # Сколько запросов может ждать токен; дальше — сразу 503
+    "max_wait": 2.0,   # Сколько максимум ждать токен в очереди, сек
+}
+
+
+class AdmissionRejected(Exception):
+    """Запрос к upstream не допущен: очередь полна или токен не дождались. retry_after — в секундах."""
+
+    def __init__(self, retry_after=1.0):
+        super().__init__(f"upstream admission rejected, retry after {retry_after:.1f}s")
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """
+    Допуск запросов, которым нужен upstream (промахи кэша), через token bucket.
+
+    Токены пополняются со скоростью rate до burst. Если токена нет, запрос встаёт в
+    очередь FIFO длиной не больше max_queue и ждёт не дольше max_wait (и не дольше
+    дедлайна запроса); при полной очереди он отклоняется сразу. Попадания в кэш сюда
+    не приходят, поэтому шторм промахов их не замедляет.
+    """
+
+    def __init__(self, rate=20.0, burst=40, max_queue=100, max_wait=2.0):
+        self.rate = rate
+        self.burst = burst
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self.tokens = float(burst)
+        self.updated_at = time.monotonic()
+        self.waiters = deque()
+        self.wakeup = None
+        self.counters = {"admitted": 0, "queued": 0, "rejected": 0, "timed_out": 0}
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def _take(self):
+        self._refill()
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+    def retry_after(self):
+        """Примерное время, через которое освободится место: очередь плюс один запрос."""
+        return (len(self.waiters) + 1) / self.rate
+
+    async def acquire(self):
+        """Ждёт токен на один upstream-запрос или поднимает AdmissionRejected."""
+        if not self.waiters and self._take():
+            self.counters["admitted"] += 1
+            return
+        if len(self.waiters) >= self.max_queue:
+            self.counters["rejected"] += 1
+            raise AdmissionRejected(self.retry_after())
+
+        waiter = asyncio.get_running_loop().create_future()
+        self.waiters.append(waiter)
+        self.counters["queued"] += 1
+        self._schedule_wakeup()
+        timeout = self.max_wait
+        budget = remaining()
+        if budget is not None:
+            timeout = max(0.0, min(timeout, budget))
+        try:
+            with timed("queue"):
+                await asyncio.wait_for(waiter, timeout)
+        except asyncio.TimeoutError:
+            self.counters["timed_out"] += 1
+            raise AdmissionRejected(self.retry_after()) from None
+        finally:
+            if not waiter.done():
+                waiter.cancel()
+            try:
+                self.waiters.remove(waiter)
+            except ValueError:
+                pass
+        self.counters["admitted"] += 1
+
+    def _schedule_wakeup(self):
+        if self.wakeup is not None or not self.waiters:
+            return
+        self._refill()
+        delay = max(0.0, (1 - self.tokens) / self.rate)
+        self.wakeup = asyncio.get_running_loop().call_later(delay, self._wake)
+
+    def _wake(self):
+        self.wakeup = None
+        while self.waiters:
+            waiter = self.waiters[0]
+            if waiter.done():
+                self.waiters.popleft()
+                continue
+            if not self._take():
+                break
+            self.waiters.popleft()
+            waiter.set_result(None)
+        self._schedule_wakeup()
+
+    def stats(self):
+        self._refill()
+        return {**self.counters, "tokens": round(self.tokens, 2), "queue": len(self.waiters)}
@@ -4,12 +4,9 @@ from datetime import timedelta
 import asyncio
 import ssl
 from linecache import cache
-import os
-import sys
-project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '../..'))
-if project_root not in sys.path:
-    sys.path.append(project_root)
-from backend.api.utils.logger import logger
+from backend.api.utils.deadline import DeadlineExceeded, remaining, wait_within_deadline
+from backend.api.utils.logger import get_logger
+logger = get_logger("cache_manager")
 
 # Глобальный кэш для хранения данных
 cache = {"data": {}, "last_update": None}
@@ -31,46 +28,58 @@ class CacheManager:
             # Perform caching logic here
             pass
 
-    async def fetch_numbers_with_retry(self, country, max_retries=2, retry_delay=30):
+    async def fetch_numbers_with_retry(self, country, max_retries=2, retry_delay=0.5):
+        """
+        Получает номера страны с повторами в пределах дедлайна запроса.
+
+        Пауза между попытками короткая (0.5 с, затем 1 с) и делается, только если после
+        неё в бюджете запроса ещё останется время на попытку.
+        """
         retries = 0
         async with aiohttp.ClientSession() as session:
             while retries < max_retries:
                 try:
-                    numbers = await self.onlinesim_helper.fetch_numbers(session, country)
-                    self.logging.debug(f"Fetched numbers for {country}: {numbers}")
+                    numbers = await wait_within_deadline(self.onlinesim_helper.fetch_numbers(session, country))
+                    self.logging.debug("Fetched %d numbers for %s", len(numbers or ()), country)
                     if numbers:
                         return numbers
                     else:
-                        self.logging.warning(f"No numbers fetched for {country}.")
+                        self.logging.warning("No numbers fetched for %s.", country)
                         return None
+                except DeadlineExceeded:
+                    self.logging.error("Deadline exceeded while fetching numbers for %s.", country)
+                    return None
                 except Exception as e:
-                    self.logging.error(f"Error fetching numbers for {country}: {e}")
+                    self.logging.error("Error fetching numbers for %s: %s", country, e)
                 retries += 1
+                budget = remaining()
+                if retries >= max_retries or (budget is not None and budget <= retry_delay):
+                    break
                 await asyncio.sleep(retry_delay)
                 retry_delay *= 2
-        self.logging.error(f"Failed to fetch numbers for {country} after {max_retries} retries.")
+        self.logging.error("Failed to fetch numbers for %s after %d retries.", country, retries)
         return None
 
     async def fetch_numbers_for_country(self, session, country):
         try:
-            self.logging.info(f"Utils: Fetching numbers for country: {country}")
+            self.logging.debug("Utils: Fetching numbers for country: %s", country)
             fresh_numbers = await self.onlinesim_helper.fetch_numbers(session, country)
-            self.logging.debug(f"Fetched numbers before sorting: {fresh_numbers}")
+            self.logging.debug("Fetched %d numbers before sorting", len(fresh_numbers or ()))
 
             if fresh_numbers:
                 sorted_numbers = self.onlinesim_helper.sort_numbers(fresh_numbers)
-                self.logging.debug(f"Sorted numbers: {sorted_numbers}")
+                self.logging.debug("Sorted %d numbers", len(sorted_numbers))
 
             # Обновляем глобальный кэш
             cache["data"][country] = sorted_numbers
             cache["last_update"] = asyncio.get_event_loop().time()
-            self.logging.info(f"Utils: Updated cache for {country}")
+            self.logging.info("Utils: Updated cache for %s", country)
         except aiohttp.ClientTimeout:
-            self.logging.error(f"Utils: Timeout while fetching numbers for country: {country}.")
+            self.logging.error("Utils: Timeout while fetching numbers for country: %s.", country)
         except ssl.SSLError:
-            self.logging.error(f"Utils: SSL error while fetching numbers for country: {country}.")
+            self.logging.error("Utils: SSL error while fetching numbers for country: %s.", country)
         except Exception as e:
-            self.logging.error(f"Utils: Unexpected error fetching numbers for country {country}: {e}")
+            self.logging.error("Utils: Unexpected error fetching numbers for country %s: %s", country, e)
 
     def get_cached_numbers(self, country):
         cached_numbers = self.number_cache.get(country, [])
@@ -85,7 +94,7 @@ class CacheManager:
                 response.raise_for_status()
                 return await response.json()
         except aiohttp.ClientError as e:
-            logger.error(f"Utils: Failed to fetch data from {url}: {e}")
+            logger.error("Utils: Failed to fetch data from %s: %s", url, e)
             return {}
         
     def get_fresh_countries(self):
@@ -0,0 +1,131 @@
+# app/utils/circuit_breaker.py
+import random
+import time
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+DEFAULT_BREAKER_CONFIG = {
+    "failure_threshold": 5,     # Сколько ошибок подряд открывают цепь
+    "recovery_timeout": 30,     # Через сколько секунд пробуем upstream снова (half-open)
+    "half_open_max_calls": 1,   # Сколько пробных запросов пропускаем в half-open
+}
+
+DEFAULT_BACKOFF_CONFIG = {
+    "base_delay": 30,    # Пауза после первой ошибки страны, сек
+    "max_delay": 1800,   # Потолок паузы, сек
+}
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker для одного upstream-хоста.
+
+    closed — запросы идут как обычно; после failure_threshold ошибок подряд цепь
+    открывается (open) и запросы сразу отклоняются. Через recovery_timeout цепь
+    переходит в half-open и пропускает half_open_max_calls пробных запросов: успех
+    закрывает её, ошибка снова открывает.
+    """
+
+    def __init__(self, name, failure_threshold=5, recovery_timeout=30, half_open_max_calls=1):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.half_open_max_calls = half_open_max_calls
+        self._state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.half_open_calls = 0
+
+    @property
+    def state(self):
+        if self._state == OPEN and time.monotonic() - self.opened_at >= self.recovery_timeout:
+            self._state = HALF_OPEN
+            self.half_open_calls = 0
+        return self._state
+
+    @property
+    def is_open(self):
+        """Цепь открыта и пробовать upstream ещё рано (не расходует пробные запросы half-open)."""
+        return self.state == OPEN
+
+    def retry_after(self):
+        """Через сколько секунд цепь перейдёт в half-open."""
+        if self.state != OPEN:
+            return 0.0
+        return max(0.0, self.recovery_timeout - (time.monotonic() - self.opened_at))
+
+    def allow(self):
+        """Можно ли сейчас выполнить запрос. В half-open расходует пробный слот."""
+        state = self.state
+        if state == CLOSED:
+            return True
+        if state == HALF_OPEN and self.half_open_calls < self.half_open_max_calls:
+            self.half_open_calls += 1
+            return True
+        return False
+
+    def release(self):
+        """Запрос отменён, не дождавшись ответа: возвращает пробный слот half-open, ничего не записывая."""
+        if self._state == HALF_OPEN and self.half_open_calls > 0:
+            self.half_open_calls -= 1
+
+    def record_success(self):
+        self._state = CLOSED
+        self.failures = 0
+
+    def record_failure(self):
+        self.failures += 1
+        if self._state == HALF_OPEN or self.failures >= self.failure_threshold:
+            self._state = OPEN
+            self.opened_at = time.monotonic()
+
+
+class CircuitBreakerRegistry:
+    """По одному CircuitBreaker на upstream-хост с общими настройками."""
+
+    def __init__(self, config=None):
+        self.config = dict(DEFAULT_BREAKER_CONFIG)
+        self.config.update(config or {})
+        self.breakers = {}
+
+    def get(self, host):
+        breaker = self.breakers.get(host)
+        if breaker is None:
+            breaker = CircuitBreaker(host, **self.config)
+            self.breakers[host] = breaker
+        return breaker
+
+    def states(self):
+        return {host: breaker.state for host, breaker in self.breakers.items()}
+
+
+class FailureBackoff:
+    """Экспоненциальная пауза с джиттером для ключей (стран), которые раз за разом падают."""
+
+    def __init__(self, base_delay=30, max_delay=1800):
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.failures = {}   # key -> число ошибок подряд
+        self.retry_at = {}   # key -> time.monotonic(), раньше которого ключ не трогаем
+
+    def record_failure(self, key):
+        failures = self.failures.get(key, 0) + 1
+        self.failures[key] = failures
+        delay = min(self.max_delay, self.base_delay * 2 ** (failures - 1))
+        # "Equal jitter": половина паузы фиксирована, половина случайна
+        self.retry_at[key] = time.monotonic() + delay / 2 + random.uniform(0, delay / 2)
+        return delay
+
+    def record_success(self, key):
+        self.failures.pop(key, None)
+        self.retry_at.pop(key, None)
+
+    def is_blocked(self, key):
+        retry_at = self.retry_at.get(key)
+        return retry_at is not None and retry_at > time.monotonic()
+
+    def retry_in(self, key):
+        retry_at = self.retry_at.get(key)
+        return max(0.0, retry_at - time.monotonic()) if retry_at is not None else 0.0
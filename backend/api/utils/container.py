@@ -0,0 +1,46 @@
+# app/utils/container.py
+import inspect
+import threading
+
+
+class ServiceContainer:
+    """
+    Реестр сервисов приложения: каждый создаётся своей фабрикой один раз, при первом get().
+
+    Фабрики импортируют модули сервисов сами, поэтому тяжёлые зависимости сервиса
+    загружаются только когда он впервые понадобился (или когда его явно создают в lifespan).
+    """
+
+    def __init__(self):
+        self.factories = {}
+        self.instances = {}
+        # RLock: фабрика может сама брать из контейнера свои зависимости
+        self.lock = threading.RLock()
+
+    def register(self, name, factory):
+        if name in self.factories:
+            raise ValueError(f"Service {name} is already registered")
+        self.factories[name] = factory
+
+    def get(self, name):
+        try:
+            return self.instances[name]
+        except KeyError:
+            pass
+        with self.lock:
+            if name not in self.instances:
+                self.instances[name] = self.factories[name]()
+            return self.instances[name]
+
+    def is_built(self, name):
+        return name in self.instances
+
+    async def close(self):
+        """Закрывает созданные сервисы в обратном порядке создания."""
+        while self.instances:
+            name, instance = self.instances.popitem()
+            close = getattr(instance, "close", None)
+            if close is not None:
+                result = close()
+                if inspect.isawaitable(result):
+                    await result
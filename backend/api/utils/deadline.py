@@ -0,0 +1,241 @@
+# app/utils/deadline.py
+import asyncio
+import random
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+DEFAULT_DEADLINE_CONFIG = {
+    "request_budget": 10.0,      # Бюджет времени на весь запрос к /numbers/*, сек
+    "path_prefix": "/numbers",   # Для каких путей действует бюджет
+    "max_attempts": 2,           # Попыток на один upstream-вызов, включая первую
+    "retry_delay": 0.2,          # Пауза перед повтором (удваивается), сек
+    "min_attempt_budget": 0.5,   # Повтор не начинаем, если от бюджета осталось меньше, сек
+    "hedge": True,               # Дублировать медленный GET вторым запросом
+    "hedge_quantile": 0.95,      # Второй запрос — когда первый медленнее этого перцентиля
+    "hedge_min_delay": 0.05,     # Не дублируем раньше, чем через столько секунд
+    "hedge_initial_delay": 1.0,  # Задержка дубля, пока статистики задержек мало, сек
+    "latency_window": 256,       # Сколько последних задержек upstream учитываем
+    "min_samples": 20,           # С какого числа замеров доверяем перцентилю
+}
+
+# Абсолютный дедлайн текущего запроса (time.monotonic()), SharedDeadline или None, если его нет
+_deadline = ContextVar("deadline", default=None)
+
+
+class DeadlineExceeded(Exception):
+    """Бюджет времени запроса исчерпан раньше, чем upstream ответил."""
+
+
+class SharedDeadline:
+    """
+    Дедлайн общего вызова нескольких запросов (single-flight).
+
+    Сдвигается на самый поздний дедлайн присоединившихся: вызов живёт, пока его ждёт
+    хоть один запрос, и обрывается, когда бюджет кончился у всех. at=None — без дедлайна.
+    """
+
+    __slots__ = ("at",)
+
+    def __init__(self, at):
+        self.at = at
+
+    def extend(self, at):
+        if self.at is not None:
+            self.at = None if at is None else max(self.at, at)
+
+
+def current_deadline():
+    """Абсолютный дедлайн текущего запроса (time.monotonic()) или None."""
+    deadline = _deadline.get()
+    return deadline.at if isinstance(deadline, SharedDeadline) else deadline
+
+
+def remaining():
+    """Сколько секунд осталось до дедлайна текущего запроса; None — дедлайна нет."""
+    deadline = current_deadline()
+    return None if deadline is None else deadline - time.monotonic()
+
+
+@contextmanager
+def deadline_scope(seconds):
+    """Устанавливает дедлайн через seconds секунд (вложенный дедлайн не может быть позже внешнего)."""
+    deadline = time.monotonic() + seconds
+    current = current_deadline()
+    token = _deadline.set(deadline if current is None else min(current, deadline))
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+async def without_deadline(awaitable):
+    """
+    Выполняет awaitable без дедлайна запроса.
+
+    Для фоновых задач, созданных из обработчика: asyncio.create_task копирует контекст,
+    и без этого фоновое обновление обрывалось бы вместе с бюджетом породившего его запроса.
+    """
+    _deadline.set(None)
+    return await awaitable
+
+
+async def within_shared_deadline(awaitable, deadline):
+    """Выполняет awaitable под общим дедлайном deadline (SharedDeadline)."""
+    _deadline.set(deadline)
+    return await awaitable
+
+
+async def wait_within_deadline(awaitable):
+    """Ждёт awaitable не дольше оставшегося бюджета; по истечении — DeadlineExceeded."""
+    budget = remaining()
+    if budget is None:
+        return await awaitable
+    try:
+        return await asyncio.wait_for(awaitable, max(0.0, budget))
+    except asyncio.TimeoutError:
+        raise DeadlineExceeded(f"deadline exceeded after waiting {max(0.0, budget):.2f}s") from None
+
+
+class DeadlineMiddleware:
+    """ASGI-middleware: задаёт дедлайн всем HTTP-запросам к путям с path_prefix."""
+
+    def __init__(self, app, budget=10.0, path_prefix="/numbers"):
+        self.app = app
+        self.budget = budget
+        self.path_prefix = path_prefix
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not scope["path"].startswith(self.path_prefix):
+            await self.app(scope, receive, send)
+            return
+        with deadline_scope(self.budget):
+            await self.app(scope, receive, send)
+
+
+class LatencyTracker:
+    """Скользящее окно последних задержек upstream для оценки перцентилей."""
+
+    def __init__(self, window=256):
+        self.samples = deque(maxlen=window)
+
+    def record(self, seconds):
+        self.samples.append(seconds)
+
+    def quantile(self, q):
+        if not self.samples:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class UpstreamCallPolicy:
+    """
+    Как выполнять один идемпотентный upstream-вызов в рамках дедлайна запроса.
+
+    Каждая попытка ограничена оставшимся бюджетом; повтор делается, только если на него
+    хватает времени. Если попытка дольше p95 последних ответов, параллельно запускается
+    второй такой же запрос (hedging) и берётся тот ответ, что пришёл раньше.
+    """
+
+    def __init__(self, config=None):
+        self.config = dict(DEFAULT_DEADLINE_CONFIG)
+        self.config.update(config or {})
+        self.latencies = LatencyTracker(self.config["latency_window"])
+        self.counters = {"calls": 0, "retries": 0, "hedged": 0, "hedge_wins": 0, "deadline_exceeded": 0}
+
+    def hedge_delay(self):
+        if len(self.latencies.samples) < self.config["min_samples"]:
+            return self.config["hedge_initial_delay"]
+        return max(self.config["hedge_min_delay"], self.latencies.quantile(self.config["hedge_quantile"]))
+
+    async def call(self, attempt, retryable=lambda error: False, hedge=True):
+        """
+        Выполняет attempt() (фабрику корутин) с повторами и hedging в рамках дедлайна.
+
+        retryable(error) решает, стоит ли повторять после ошибки. hedge=False отключает дубль
+        (например, когда circuit breaker в half-open и лишний пробный запрос недопустим).
+        """
+        self.counters["calls"] += 1
+        max_attempts = max(1, self.config["max_attempts"])
+        for attempt_number in range(max_attempts):
+            budget = remaining()
+            if budget is not None and budget <= 0:
+                self.counters["deadline_exceeded"] += 1
+                raise DeadlineExceeded("no time left for an upstream call")
+            use_hedge = hedge and self.config["hedge"]
+            try:
+                return await self._bounded(self._hedged(attempt) if use_hedge else self._measured(attempt), budget)
+            except DeadlineExceeded:
+                self.counters["deadline_exceeded"] += 1
+                raise
+            except Exception as e:
+                if attempt_number + 1 >= max_attempts or not retryable(e):
+                    raise
+                delay = self.config["retry_delay"] * 2 ** attempt_number
+                delay = delay / 2 + random.uniform(0, delay / 2)
+                budget = remaining()
+                if budget is not None and budget < delay + self.config["min_attempt_budget"]:
+                    raise  # На повтор времени не хватит — сразу отдаём ошибку
+                self.counters["retries"] += 1
+                await asyncio.sleep(delay)
+
+    async def _bounded(self, coroutine, budget):
+        if budget is None:
+            return await coroutine
+        task = asyncio.ensure_future(coroutine)
+        try:
+            while True:
+                done, _ = await asyncio.wait({task}, timeout=max(0.0, budget))
+                if done:
+                    return task.result()
+                # Общий дедлайн single-flight мог сдвинуться, пока шла попытка
+                budget = remaining()
+                if budget is None:
+                    return await task
+                if budget <= 0:
+                    raise DeadlineExceeded("upstream call exceeded the request deadline")
+        finally:
+            if not task.done():
+                task.cancel()
+
+    async def _measured(self, attempt):
+        started = time.monotonic()
+        result = await attempt()
+        self.latencies.record(time.monotonic() - started)
+        return result
+
+    async def _hedged(self, attempt):
+        first = asyncio.ensure_future(self._measured(attempt))
+        tasks = [first]
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=self.hedge_delay())
+            if done:
+                return first.result()
+            self.counters["hedged"] += 1
+            tasks.append(asyncio.ensure_future(self._measured(attempt)))
+            pending = set(tasks)
+            error = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is not first:
+                            self.counters["hedge_wins"] += 1
+                        return task.result()
+                    if error is None or task is first:
+                        error = task.exception()
+            raise error
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+
+    def stats(self):
+        p95 = self.latencies.quantile(0.95)
+        return {
+            **self.counters,
+            "p95_latency": round(p95, 3) if p95 is not None else None,
+            "hedge_delay": round(self.hedge_delay(), 3),
+        }
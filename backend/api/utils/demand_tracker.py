@@ -0,0 +1,85 @@
+# app/utils/demand_tracker.py
+import math
+import time
+
+# Ключ для запросов, читающих все страны сразу (/numbers/countries)
+ALL_KEYS = "*"
+
+DEFAULT_DEMAND_CONFIG = {
+    "half_life": 3600,       # За сколько секунд счётчик запросов страны уменьшается вдвое
+    "hot_interval": 120,     # Интервал обновления самых популярных стран, сек
+    "cold_interval": 3600,   # Интервал обновления редко запрашиваемых стран, сек
+    "hot_score": 30,         # Начиная с такого (затухающего) числа запросов страна считается горячей
+}
+
+
+class DemandTracker:
+    """
+    Счётчики запросов по странам с экспоненциальным затуханием.
+
+    По счётчику выбирается интервал обновления: горячие страны обновляются каждые
+    hot_interval секунд, холодные — раз в cold_interval, а страны, которые никто не
+    запрашивал (ни напрямую, ни через общий список), фоном не обновляются вовсе.
+
+    При нескольких воркерах каждый копит свои запросы в pending и сбрасывает их в общий
+    снимок (take_pending), а лидер, который планирует обновления, загружает оттуда
+    суммарные счётчики (load_shared).
+    """
+
+    def __init__(self, half_life=3600, hot_interval=120, cold_interval=3600, hot_score=30):
+        self.decay_rate = math.log(2) / half_life
+        self.hot_interval = hot_interval
+        self.cold_interval = max(cold_interval, hot_interval)
+        self.hot_score = hot_score
+        self.scores = {}  # key -> (score, updated_at)
+        self.pending = {}  # key -> запросы, ещё не переданные в общий снимок
+
+    def _decayed(self, key, now):
+        entry = self.scores.get(key)
+        if entry is None:
+            return 0.0
+        score, updated_at = entry
+        return score * math.exp(-self.decay_rate * (now - updated_at))
+
+    def record(self, key, weight=1.0):
+        now = time.monotonic()
+        self.scores[key] = (self._decayed(key, now) + weight, now)
+        self.pending[key] = self.pending.get(key, 0.0) + weight
+
+    def take_pending(self):
+        """Возвращает и обнуляет запросы, накопленные с прошлого сброса в общий снимок."""
+        pending, self.pending = self.pending, {}
+        return pending
+
+    def restore_pending(self, pending):
+        """Возвращает несохранённые запросы обратно, если сброс не удался."""
+        for key, weight in pending.items():
+            self.pending[key] = self.pending.get(key, 0.0) + weight
+
+    def load_shared(self, rows):
+        """Заменяет счётчики общими {key: (score, updated_at по time.time())} от всех воркеров."""
+        now, wall_now = time.monotonic(), time.time()
+        self.scores = {key: (score, now - (wall_now - updated_at)) for key, (score, updated_at) in rows.items()}
+
+    def score(self, key):
+        return self._decayed(key, time.monotonic())
+
+    def refresh_interval(self, key):
+        """Интервал обновления для ключа в секундах или None, если обновлять его фоном не нужно."""
+        score = self.score(key)
+        if score <= 0 and key not in self.scores:
+            # Страну напрямую не запрашивали: держим её на холодном интервале, только если кто-то читает весь список
+            return self.cold_interval if ALL_KEYS in self.scores else None
+        if score >= self.hot_score:
+            return self.hot_interval
+        # Между холодным и горячим интервалом — логарифмическая шкала по счётчику
+        ratio = math.log1p(score) / math.log1p(self.hot_score)
+        return self.cold_interval * (self.hot_interval / self.cold_interval) ** ratio
+
+    def top(self, limit=10):
+        now = time.monotonic()
+        ranked = sorted(((self._decayed(key, now), key) for key in self.scores if key != ALL_KEYS), reverse=True)
+        return [
+            {"key": key, "score": round(score, 2), "refresh_interval": round(self.refresh_interval(key))}
+            for score, key in ranked[:limit]
+        ]
@@ -0,0 +1,80 @@
+# app/utils/executors.py
+import asyncio
+import contextvars
+import functools
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+DEFAULT_EXECUTOR_CONFIG = {
+    "io_threads": 8,                # Потоки для блокирующего I/O (requests к namegen.jp)
+    "cpu_processes": 2,             # Процессы для CPU-работы (генерация паролей)
+    "cpu_start_method": "spawn",    # spawn: дочерние процессы не наследуют потоки, локи и состояние random
+    "cpu_offload_min_chars": 1024,  # Меньшие пачки паролей дешевле сгенерировать на месте, чем отправить в процесс
+}
+
+
+class Executors:
+    """
+    Пулы для работы, которую нельзя выполнять на event loop.
+
+    run_io — ограниченный пул потоков для блокирующих вызовов; run_cpu — пул процессов
+    для вычислений, которые иначе держали бы GIL. Пулы создаются при первом использовании,
+    поэтому воркер, который не получает RNA-запросов, не держит лишних потоков и процессов.
+    """
+
+    def __init__(self, io_threads=8, cpu_processes=2, cpu_start_method="spawn", cpu_offload_min_chars=1024):
+        self.io_threads = io_threads
+        self.cpu_processes = cpu_processes
+        self.cpu_start_method = cpu_start_method
+        self.cpu_offload_min_chars = cpu_offload_min_chars
+        self._io = None
+        self._cpu = None
+        self._lock = threading.Lock()
+        self.counters = {"io_calls": 0, "cpu_calls": 0, "io_running": 0, "cpu_running": 0}
+
+    @property
+    def io(self):
+        if self._io is None:
+            with self._lock:
+                if self._io is None:
+                    self._io = ThreadPoolExecutor(max_workers=self.io_threads, thread_name_prefix="io")
+        return self._io
+
+    @property
+    def cpu(self):
+        if self._cpu is None:
+            with self._lock:
+                if self._cpu is None:
+                    self._cpu = ProcessPoolExecutor(
+                        max_workers=self.cpu_processes,
+                        mp_context=multiprocessing.get_context(self.cpu_start_method),
+                    )
+        return self._cpu
+
+    async def run_io(self, fn, *args, **kwargs):
+        """Выполняет блокирующую fn в пуле потоков; contextvars запроса видны внутри."""
+        call = functools.partial(contextvars.copy_context().run, fn, *args, **kwargs)
+        return await self._run("io", self.io, call)
+
+    async def run_cpu(self, fn, *args, **kwargs):
+        """Выполняет fn в пуле процессов; fn и аргументы должны сериализоваться pickle."""
+        return await self._run("cpu", self.cpu, functools.partial(fn, *args, **kwargs))
+
+    async def _run(self, kind, executor, call):
+        self.counters[f"{kind}_calls"] += 1
+        self.counters[f"{kind}_running"] += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(executor, call)
+        finally:
+            self.counters[f"{kind}_running"] -= 1
+
+    def stats(self):
+        return {**self.counters, "io_threads": self.io_threads, "cpu_processes": self.cpu_processes}
+
+    def close(self):
+        for executor in (self._io, self._cpu):
+            if executor is not None:
+                executor.shutdown(wait=False, cancel_futures=True)
+        self._io = None
+        self._cpu = None
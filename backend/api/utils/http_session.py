@@ -0,0 +1,48 @@
+# app/utils/http_session.py
+import aiohttp
+from backend.api.utils.logger import logger
+
+# Значения по умолчанию для пула соединений к onlinesim.site
+DEFAULT_HTTP_CONFIG = {
+    "limit": 100,               # Общий лимит соединений в пуле
+    "limit_per_host": 20,       # Лимит соединений на один хост
+    "ttl_dns_cache": 300,       # Время жизни DNS-кэша в секундах
+    "keepalive_timeout": 60,    # Сколько держать простаивающее соединение открытым
+    "timeout_total": 30,        # Общий бюджет на запрос
+    "timeout_connect": 5,       # Получение соединения из пула + установка TCP/TLS
+    "timeout_sock_read": 15,    # Ожидание данных из сокета
+}
+
+
+def build_http_config(config=None):
+    """Объединяет пользовательские настройки HTTP с значениями по умолчанию."""
+    http_config = dict(DEFAULT_HTTP_CONFIG)
+    http_config.update(config or {})
+    return http_config
+
+
+def create_client_session(config=None):
+    """
+    Создаёт общий aiohttp.ClientSession с настроенным TCPConnector и таймаутами.
+
+    Сессию нужно создавать внутри работающего event loop и закрывать через close().
+    """
+    http_config = build_http_config(config)
+    connector = aiohttp.TCPConnector(
+        limit=http_config["limit"],
+        limit_per_host=http_config["limit_per_host"],
+        ttl_dns_cache=http_config["ttl_dns_cache"],
+        keepalive_timeout=http_config["keepalive_timeout"],
+        enable_cleanup_closed=True,
+    )
+    timeout = aiohttp.ClientTimeout(
+        total=http_config["timeout_total"],
+        connect=http_config["timeout_connect"],
+        sock_read=http_config["timeout_sock_read"],
+    )
+    logger.info(
+        f"HTTP session created: limit={http_config['limit']}, "
+        f"limit_per_host={http_config['limit_per_host']}, "
+        f"timeout_total={http_config['timeout_total']}s"
+    )
+    return aiohttp.ClientSession(connector=connector, timeout=timeout)
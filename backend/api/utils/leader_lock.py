@@ -0,0 +1,56 @@
+# app/utils/leader_lock.py
+import os
+
+try:
+    import fcntl
+except ImportError:  # Windows: один процесс, блокировка между воркерами не нужна
+    fcntl = None
+
+
+class LeaderLock:
+    """
+    Выбор лидера среди воркеров через эксклюзивный flock на файле.
+
+    Лидером становится тот воркер, который первым взял блокировку; только он ходит в
+    upstream за обновлением кэша. Если лидер умирает, ОС снимает блокировку и её
+    забирает следующий воркер при очередной попытке try_acquire().
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.handle = None
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    @property
+    def is_leader(self):
+        return self.handle is not None
+
+    def try_acquire(self):
+        """Неблокирующая попытка стать лидером. Возвращает True, если этот воркер — лидер."""
+        if self.handle is not None:
+            return True
+        if fcntl is None:
+            self.handle = True
+            return True
+        handle = open(self.path, "a+")
+        try:
+            fcntl.flock(handle.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            handle.close()
+            return False
+        handle.seek(0)
+        handle.truncate()
+        handle.write(str(os.getpid()))
+        handle.flush()
+        self.handle = handle
+        return True
+
+    def release(self):
+        if self.handle is None:
+            return
+        if fcntl is not None:
+            fcntl.flock(self.handle.fileno(), fcntl.LOCK_UN)
+            self.handle.close()
+        self.handle = None
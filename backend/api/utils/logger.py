@@ -1,31 +1,169 @@
+import atexit
+import copy
+import json
 import logging
 import os
-from logging.handlers import TimedRotatingFileHandler
-
-LOG_DIR = "api/logs"
-os.makedirs(LOG_DIR, exist_ok=True)
-
-# Создаем TimedRotatingFileHandler для ротации логов по дате
-log_file_handler = TimedRotatingFileHandler(
-    filename=os.path.join(LOG_DIR, "app_log.txt"),  # Основной файл лога
-    when="midnight",  # Ротация логов каждый день в полночь
-    interval=1,       # Интервал ротации (1 день)
-    backupCount=7,    # Хранить 7 архивных логов
-    encoding="utf-8"  # Кодировка файла логов
-)
-
-log_file_handler.setFormatter(logging.Formatter(
-    "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
-))
-
-# Конфигурация логгера
-logging.basicConfig(
-    level=logging.DEBUG,
-    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
-    handlers=[
-        log_file_handler,          # Логи в файл с ротацией
-        logging.StreamHandler()    # Логи в консоль
-    ]
-)
-
-logger = logging.getLogger("9733n API")
+import queue
+import random
+import time
+from logging.handlers import QueueHandler, QueueListener, TimedRotatingFileHandler
+
+from backend.api.config import main_config
+
+ROOT_LOGGER_NAME = "9733n API"
+TEXT_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+
+DEFAULT_LOGGING_CONFIG = {
+    "dir": "api/logs",
+    "level": "INFO",               # Общий уровень (раньше был DEBUG для всего)
+    "levels": {                    # Уровни отдельных логгеров, например "9733n API.onlinesim_lib": "DEBUG"
+        "asyncio": "WARNING",
+    },
+    "format": "text",              # "text" или "json" (JSON lines: одна запись — одна строка)
+    "console": True,
+    "rate_limit_level": "DEBUG",   # Записи этого уровня и ниже ограничиваются по частоте
+    "rate_limit_interval": 1.0,    # Окно ограничения, сек
+    "rate_limit_burst": 10,        # Сколько одинаковых записей (по шаблону сообщения) пропускать за окно
+    "sample_rate": 1.0,            # Доля записей уровня rate_limit_level и ниже, которые вообще пишутся
+}
+
+
+def build_logging_config(config=None):
+    logging_config = dict(DEFAULT_LOGGING_CONFIG)
+    logging_config.update(config or {})
+    return logging_config
+
+
+class JsonLinesFormatter(logging.Formatter):
+    """Одна запись — одна JSON-строка: удобно для сбора логов без разбора текста."""
+
+    def format(self, record):
+        entry = {
+            "ts": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False)
+
+
+class RateLimitFilter(logging.Filter):
+    """
+    Ограничивает частоту отладочных записей из горячих путей.
+
+    Записи уровня max_level и ниже группируются по логгеру и шаблону сообщения (msg до
+    подстановки аргументов): в каждом окне interval пропускается не больше burst записей,
+    остальные отбрасываются ещё до постановки в очередь. Первая пропущенная запись
+    следующего окна сообщает, сколько было отброшено. sample_rate < 1 дополнительно
+    оставляет только случайную долю таких записей.
+    """
+
+    def __init__(self, max_level=logging.DEBUG, interval=1.0, burst=10, sample_rate=1.0):
+        super().__init__()
+        self.max_level = max_level
+        self.interval = interval
+        self.burst = burst
+        self.sample_rate = sample_rate
+        self.windows = {}  # (logger, msg) -> [начало окна, пропущено, отброшено]
+
+    def filter(self, record):
+        if record.levelno > self.max_level:
+            return True
+        if self.sample_rate < 1.0 and random.random() >= self.sample_rate:
+            return False
+        key = (record.name, record.msg if isinstance(record.msg, str) else type(record.msg))
+        now = time.monotonic()
+        window = self.windows.get(key)
+        if window is None or now - window[0] >= self.interval:
+            suppressed = window[2] if window is not None else 0
+            self.windows[key] = [now, 1, 0]
+            if suppressed:
+                record.msg = f"{record.msg} [{suppressed} similar messages suppressed]"
+            if len(self.windows) > 10000:
+                self.windows.clear()
+            return True
+        if window[1] < self.burst:
+            window[1] += 1
+            return True
+        window[2] += 1
+        return False
+
+
+class LoopSafeQueueHandler(QueueHandler):
+    """
+    QueueHandler, который в потоке вызова только подставляет аргументы в сообщение.
+
+    Форматирование (время, JSON, traceback) и запись на диск/в консоль выполняет поток
+    QueueListener, поэтому медленный диск не блокирует event loop.
+    """
+
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+
+def build_handlers(logging_config):
+    """Конечные обработчики (файл с ротацией и консоль), которые работают в потоке QueueListener."""
+    formatter = JsonLinesFormatter() if logging_config["format"] == "json" else logging.Formatter(TEXT_FORMAT)
+    os.makedirs(logging_config["dir"], exist_ok=True)
+    # TimedRotatingFileHandler для ротации логов по дате
+    file_handler = TimedRotatingFileHandler(
+        filename=os.path.join(logging_config["dir"], "app_log.txt"),  # Основной файл лога
+        when="midnight",  # Ротация логов каждый день в полночь
+        interval=1,       # Интервал ротации (1 день)
+        backupCount=7,    # Хранить 7 архивных логов
+        encoding="utf-8"  # Кодировка файла логов
+    )
+    handlers = [file_handler]
+    if logging_config["console"]:
+        handlers.append(logging.StreamHandler())
+    for handler in handlers:
+        handler.setFormatter(formatter)
+    return handlers
+
+
+def build_queue_handler(log_queue, logging_config):
+    queue_handler = LoopSafeQueueHandler(log_queue)
+    queue_handler.addFilter(RateLimitFilter(
+        max_level=logging.getLevelName(logging_config["rate_limit_level"]),
+        interval=logging_config["rate_limit_interval"],
+        burst=logging_config["rate_limit_burst"],
+        sample_rate=logging_config["sample_rate"],
+    ))
+    return queue_handler
+
+
+def setup_logging(config=None):
+    """
+    Настраивает корневой логгер: QueueHandler в вызывающем потоке, запись — в QueueListener.
+
+    Возвращает запущенный QueueListener; он останавливается (с дозаписью очереди) при выходе.
+    """
+    logging_config = build_logging_config(config)
+    log_queue = queue.SimpleQueue()
+    listener = QueueListener(log_queue, *build_handlers(logging_config), respect_handler_level=True)
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(build_queue_handler(log_queue, logging_config))
+    root.setLevel(logging_config["level"])
+    for name, level in logging_config["levels"].items():
+        logging.getLogger(name).setLevel(level)
+
+    listener.start()
+    atexit.register(listener.stop)
+    return listener
+
+
+def get_logger(name=None):
+    """Логгер модуля — потомок "9733n API", чтобы уровень можно было задать отдельно в config."""
+    return logging.getLogger(f"{ROOT_LOGGER_NAME}.{name}" if name else ROOT_LOGGER_NAME)
+
+
+log_listener = setup_logging(main_config.get("logging"))
+logger = get_logger()
@@ -0,0 +1,231 @@
+# app/utils/metrics.py
+import time
+from bisect import bisect_left
+
+# Границы корзин гистограмм задержек, сек
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labelnames, labels, extra=()):
+    pairs = list(zip(labelnames, labels)) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+
+    def header(self):
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+
+class SimpleMetric(Metric):
+    """
+    Метрика с одним числом на набор меток.
+
+    Значения либо накапливаются в словаре по кортежу меток (одна операция на запись),
+    либо считаются при каждом сборе функцией collect(), которая возвращает {кортеж меток: значение}.
+    """
+
+    def __init__(self, name, documentation, labelnames=(), collect=None):
+        super().__init__(name, documentation, labelnames)
+        self.values = {}
+        self.collect = collect
+
+    def inc(self, *labels, amount=1):
+        self.values[labels] = self.values.get(labels, 0) + amount
+
+    def render(self):
+        lines = self.header()
+        values = self.values
+        if self.collect is not None:
+            try:
+                values = self.collect()
+            except Exception:
+                values = {}
+        for labels, value in values.items():
+            lines.append(f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}")
+        return lines
+
+
+class Counter(SimpleMetric):
+    """Монотонный счётчик."""
+
+    kind = "counter"
+
+
+class Gauge(SimpleMetric):
+    """Текущее значение."""
+
+    kind = "gauge"
+
+    def set(self, value, *labels):
+        self.values[labels] = value
+
+    def dec(self, *labels, amount=1):
+        self.values[labels] = self.values.get(labels, 0) - amount
+
+
+class Histogram(Metric):
+    """
+    Гистограмма с фиксированными корзинами.
+
+    observe() — bisect по границам и три сложения; кумулятивные суммы считаются только при сборе.
+    """
+
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self.series = {}  # labels -> [counts по корзинам (+Inf последней), sum, count]
+
+    def observe(self, value, *labels):
+        series = self.series.get(labels)
+        if series is None:
+            series = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            self.series[labels] = series
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1] += value
+        series[2] += 1
+
+    def time(self, *labels):
+        return _Timer(self, labels)
+
+    def render(self):
+        lines = self.header()
+        for labels, (counts, total, count) in self.series.items():
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                bucket_labels = _format_labels(self.labelnames, labels, [("le", _format_value(bound))])
+                lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+            label_text = _format_labels(self.labelnames, labels)
+            lines.append(f"{self.name}_sum{label_text} {_format_value(total)}")
+            lines.append(f"{self.name}_count{label_text} {count}")
+        return lines
+
+
+class _Timer:
+    """with histogram.time("label"): ... — наблюдает длительность блока."""
+
+    __slots__ = ("histogram", "labels", "started")
+
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.histogram.observe(time.perf_counter() - self.started, *self.labels)
+        return False
+
+
+class MetricsRegistry:
+    """Реестр метрик процесса и их выдача в текстовом формате Prometheus."""
+
+    def __init__(self):
+        self.metrics = {}
+
+    def register(self, metric):
+        if metric.name in self.metrics:
+            raise ValueError(f"Metric {metric.name} is already registered")
+        self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, documentation, labelnames=(), collect=None):
+        return self.register(Counter(name, documentation, labelnames, collect))
+
+    def gauge(self, name, documentation, labelnames=(), collect=None):
+        return self.register(Gauge(name, documentation, labelnames, collect))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self):
+        lines = []
+        for metric in self.metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+# Метрики, которые пишут разные модули; собраны здесь, чтобы имена и метки были в одном месте
+HTTP_REQUEST_DURATION = registry.histogram(
+    "http_request_duration_seconds", "HTTP request latency by route template", ("method", "route", "status")
+)
+HTTP_REQUESTS_IN_FLIGHT = registry.gauge("http_requests_in_flight", "HTTP requests currently being handled")
+UPSTREAM_REQUEST_DURATION = registry.histogram(
+    "upstream_request_duration_seconds", "Upstream HTTP request latency by host and outcome", ("host", "outcome")
+)
+UPSTREAM_REQUESTS_IN_FLIGHT = registry.gauge(
+    "upstream_requests_in_flight", "Upstream HTTP requests currently in flight", ("host",)
+)
+CACHE_REQUESTS = registry.counter(
+    "cache_requests_total", "Cache lookups by cache and result (fresh, stale, miss, negative, hit)", ("cache", "result")
+)
+REFRESH_SWEEP_DURATION = registry.histogram(
+    "refresh_sweep_duration_seconds", "Duration of numbers cache refresh sweeps",
+    buckets=(0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0, 120.0, 300.0),
+)
+REFRESH_SWEEP_COUNTRIES = registry.counter(
+    "refresh_sweep_countries_total", "Countries processed by refresh sweeps by outcome", ("outcome",)
+)
+REFRESH_SWEEP_SIZE = registry.gauge("refresh_sweep_size", "Number of countries in the last refresh sweep")
+
+
+class MetricsMiddleware:
+    """
+    ASGI-middleware: задержка и число одновременных HTTP-запросов.
+
+    Метка route — шаблон пути (/numbers/{country}), а не сам путь, чтобы число рядов
+    не росло с количеством номеров и стран; неизвестные пути попадают в "unmatched".
+    """
+
+    def __init__(self, app, exclude=("/metrics",)):
+        self.app = app
+        self.exclude = frozenset(exclude)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in self.exclude:
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        started = time.perf_counter()
+        HTTP_REQUESTS_IN_FLIGHT.inc()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            HTTP_REQUESTS_IN_FLIGHT.dec()
+            route = scope.get("route")
+            route_path = getattr(route, "path_format", None) or getattr(route, "path", None) or "unmatched"
+            HTTP_REQUEST_DURATION.observe(time.perf_counter() - started, scope["method"], route_path, str(status))
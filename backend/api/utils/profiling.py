@@ -0,0 +1,233 @@
+# app/utils/profiling.py
+# Копия ServerTimings, frame_label, collapse и StackSampler есть во frontend/src/profiling.py
+# (образ frontend не может импортировать backend): правки вносите в обе копии.
+import asyncio
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+# Разбивка времени текущего запроса по фазам (upstream, parse, serialize, ...) или None вне запроса
+_timings = ContextVar("server_timings", default=None)
+
+
+class ServerTimings:
+    """Суммарное время и число вызовов по фазам одного запроса."""
+
+    __slots__ = ("started", "phases")
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.phases = {}  # phase -> [секунды, вызовов]
+
+    def add(self, phase, seconds):
+        entry = self.phases.get(phase)
+        if entry is None:
+            self.phases[phase] = [seconds, 1]
+        else:
+            entry[0] += seconds
+            entry[1] += 1
+
+    def header(self):
+        """Значение заголовка Server-Timing: фазы и общее время до отправки заголовков, в мс."""
+        parts = [
+            f'{phase};dur={seconds * 1000:.1f};desc="{count}x"'
+            for phase, (seconds, count) in self.phases.items()
+        ]
+        parts.append(f"total;dur={(time.perf_counter() - self.started) * 1000:.1f}")
+        return ", ".join(parts)
+
+
+def record_timing(phase, seconds):
+    """Добавляет seconds к фазе текущего запроса; вне запроса ничего не делает."""
+    timings = _timings.get()
+    if timings is not None:
+        timings.add(phase, seconds)
+
+
+@contextmanager
+def timed(phase):
+    """with timed("parse"): ... — время блока попадает в Server-Timing текущего запроса."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_timing(phase, time.perf_counter() - started)
+
+
+def frame_label(frame):
+    code = frame.f_code
+    filename = "/".join(code.co_filename.replace("\\", "/").rsplit("/", 2)[-2:])
+    return f"{code.co_name} ({filename}:{code.co_firstlineno})".replace(";", ":")
+
+
+def collapse(frame):
+    """Стек кадра в формате collapsed stacks: корень слева, вызовы через ';'."""
+    labels = []
+    while frame is not None:
+        labels.append(frame_label(frame))
+        frame = frame.f_back
+    return ";".join(reversed(labels))
+
+
+class StackSampler:
+    """
+    Сэмплирующий профайлер: отдельный поток раз в interval снимает стеки потоков.
+
+    thread_ids — какие потоки сэмплировать (по умолчанию все, кроме самого сэмплера).
+    accept(thread_id) позволяет отбросить отдельные сэмплы, например, когда event loop
+    выполняет не ту задачу. Результат — collapsed stacks, совместимые с flamegraph.pl/speedscope.
+    """
+
+    def __init__(self, interval=0.005, thread_ids=None, accept=None):
+        self.interval = interval
+        self.thread_ids = thread_ids
+        self.accept = accept
+        self.stacks = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        return self
+
+    def _run(self):
+        own_id = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id or (self.thread_ids is not None and thread_id not in self.thread_ids):
+                    continue
+                if self.accept is not None and not self.accept(thread_id):
+                    continue
+                self.stacks[collapse(frame)] += 1
+                self.samples += 1
+
+    def collapsed(self):
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+
+def route_pattern(route):
+    """/numbers/{country} -> регулярное выражение для сырого пути запроса."""
+    parts = re.split(r"(\{[^}]+\})", route)
+    return re.compile("^" + "".join("[^/]+" if part.startswith("{") else re.escape(part) for part in parts) + "$")
+
+
+class RequestProfiler:
+    """
+    Профилирование следующих N запросов к маршруту на event loop.
+
+    Пока захват активен, middleware помечает задачи подходящих запросов, а сэмплер
+    сохраняет стек потока event loop только тогда, когда там выполняется помеченная задача.
+    """
+
+    def __init__(self):
+        self.pattern = None
+        self.remaining = 0
+        self.tasks = set()
+        self.finished = None
+
+    def matches(self, path):
+        return self.pattern is not None and self.remaining > 0 and self.pattern.match(path) is not None
+
+    @contextmanager
+    def track(self):
+        """Оборачивает обработку подходящего запроса: его задача попадает в профиль."""
+        self.remaining -= 1
+        task = asyncio.current_task()
+        self.tasks.add(task)
+        try:
+            yield
+        finally:
+            self.tasks.discard(task)
+            if self.remaining <= 0 and not self.tasks and self.finished is not None:
+                self.finished.set()
+
+    async def capture(self, route, requests, timeout, interval=0.005):
+        """Ждёт requests запросов к route (не дольше timeout) и возвращает сэмплер с их стеками."""
+        loop = asyncio.get_running_loop()
+        self.pattern = route_pattern(route)
+        self.remaining = requests
+        self.finished = asyncio.Event()
+        sampler = StackSampler(
+            interval,
+            thread_ids={threading.get_ident()},
+            accept=lambda thread_id: asyncio.current_task(loop) in self.tasks,
+        ).start()
+        try:
+            await asyncio.wait_for(self.finished.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            sampler.stop()
+            self.pattern = None
+            self.remaining = 0
+            self.finished = None
+        return sampler
+
+
+request_profiler = RequestProfiler()
+
+
+async def sample_loop(seconds, interval=0.005):
+    """Сэмплирует поток event loop seconds секунд, не блокируя его."""
+    sampler = StackSampler(interval, thread_ids={threading.get_ident()}).start()
+    try:
+        await asyncio.sleep(seconds)
+    finally:
+        sampler.stop()
+    return sampler
+
+
+class ServerTimingMiddleware:
+    """
+    ASGI-middleware: заголовок Server-Timing с разбивкой времени запроса по фазам.
+
+    Фазы пишет код через timed()/record_timing() (upstream, parse, serialize, queue, ...),
+    total — время до отправки заголовков ответа. Здесь же запросы, подходящие под
+    активный захват RequestProfiler, помечаются для профилирования.
+    """
+
+    def __init__(self, app, profiler=request_profiler):
+        self.app = app
+        self.profiler = profiler
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        timings = ServerTimings()
+        token = _timings.set(timings)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers", [])) + [
+                    (b"server-timing", timings.header().encode("latin-1"))
+                ]
+            await send(message)
+
+        try:
+            if self.profiler.matches(scope["path"]):
+                with self.profiler.track():
+                    await self.app(scope, receive, send_wrapper)
+            else:
+                await self.app(scope, receive, send_wrapper)
+        finally:
+            _timings.reset(token)
+
+
+def admin_token():
+    """Токен администратора из окружения; без него админские эндпоинты выключены."""
+    return os.getenv("ADMIN_TOKEN") or None
@@ -0,0 +1,169 @@
+# app/utils/response_cache.py
+import gzip
+import hashlib
+import json
+from fastapi.responses import Response
+from backend.api.utils.metrics import CACHE_REQUESTS
+from backend.api.utils.profiling import timed
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+JSON_MEDIA_TYPE = "application/json"
+MSGPACK_MEDIA_TYPE = "application/msgpack"
+MSGPACK_ACCEPT = ("application/msgpack", "application/x-msgpack")
+
+
+def dumps_json(payload):
+    """Быстрая сериализация в JSON-байты: orjson, если установлен, иначе stdlib json."""
+    if orjson is not None:
+        return orjson.dumps(payload)
+    return json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def dumps_msgpack(payload):
+    return msgpack.packb(payload, use_bin_type=True)
+
+
+ENCODERS = {JSON_MEDIA_TYPE: dumps_json, MSGPACK_MEDIA_TYPE: dumps_msgpack}
+
+MIN_COMPRESS_SIZE = 1024  # Мелкие ответы не сжимаем: выигрыш меньше накладных расходов
+COMPRESSORS = {"gzip": lambda body: gzip.compress(body, compresslevel=6, mtime=0)}
+if brotli is not None:
+    COMPRESSORS["br"] = lambda body: brotli.compress(body, quality=5)
+ENCODING_PREFERENCE = ("br", "gzip")
+
+
+def negotiate_media_type(accept):
+    """Выбирает формат ответа по заголовку Accept: MessagePack, если клиент его просит и он доступен."""
+    if msgpack is not None and accept and any(media_type in accept for media_type in MSGPACK_ACCEPT):
+        return MSGPACK_MEDIA_TYPE
+    return JSON_MEDIA_TYPE
+
+
+def negotiate_encoding(accept_encoding):
+    """Выбирает сжатие по Accept-Encoding: brotli, затем gzip, иначе без сжатия."""
+    if not accept_encoding:
+        return None
+    accepted = {part.split(";")[0].strip().lower() for part in accept_encoding.split(",")}
+    for encoding in ENCODING_PREFERENCE:
+        if encoding in accepted and encoding in COMPRESSORS:
+            return encoding
+    return None
+
+
+def etag_matches(if_none_match, etag):
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    # Для If-None-Match используется слабое сравнение: префикс W/ не учитывается
+    candidates = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+    return etag.removeprefix("W/") in candidates
+
+
+class ResponseCache:
+    """
+    Готовые тела ответов (bytes), сериализованные один раз на версию кэша.
+
+    version_getter возвращает текущую версию данных; как только она меняется, все
+    сохранённые тела сбрасываются и при следующем запросе собираются заново.
+    """
+
+    def __init__(self, version_getter, name="responses"):
+        self.version_getter = version_getter
+        self.name = name  # Метка cache в cache_requests_total
+        self.version = None
+        self.bodies = {}
+        self.etags = {}
+
+    def _sync_version(self):
+        version = self.version_getter()
+        if version != self.version:
+            self.bodies.clear()
+            self.etags.clear()
+            self.version = version
+        return version
+
+    def _body(self, key, media_type, build, record=True):
+        body = self.bodies.get((key, media_type, None))
+        if body is None:
+            if record:
+                CACHE_REQUESTS.inc(self.name, "miss")
+            with timed("serialize"):
+                body = ENCODERS[media_type](build())
+            self.bodies[(key, media_type, None)] = body
+        elif record:
+            CACHE_REQUESTS.inc(self.name, "hit")
+        return body
+
+    def etag(self, key, media_type, build):
+        """
+        Слабый ETag из хэша сериализованного тела, считается один раз на версию.
+
+        Версия кэша — счётчик своего процесса и начинается с 1 после рестарта, поэтому
+        ETag зависит только от содержимого: разные воркеры с разными данными не выдают
+        одинаковый тег, а с одинаковыми — выдают. Слабый, потому что сжатые и несжатые
+        варианты одного ответа семантически равны.
+        """
+        self._sync_version()
+        etag = self.etags.get((key, media_type))
+        if etag is None:
+            digest = hashlib.blake2b(self._body(key, media_type, build), digest_size=10).hexdigest()
+            etag = f'W/"{digest}"'
+            self.etags[(key, media_type)] = etag
+        return etag
+
+    def get(self, key, media_type, build, encoding=None, record=True):
+        """
+        Возвращает (body, encoding) для key в формате media_type; build() строит payload при промахе.
+
+        encoding ("gzip"/"br") — вернуть сжатый вариант; он тоже сжимается один раз на версию.
+        Для маленьких тел сжатие пропускается, и во втором элементе возвращается None.
+        record=False — не учитывать обращение в cache_requests_total (его уже учёл etag()).
+        """
+        self._sync_version()
+        body = self._body(key, media_type, build, record)
+        if encoding is None or len(body) < MIN_COMPRESS_SIZE:
+            return body, None
+        compressed = self.bodies.get((key, media_type, encoding))
+        if compressed is None:
+            with timed("compress"):
+                compressed = COMPRESSORS[encoding](body)
+            self.bodies[(key, media_type, encoding)] = compressed
+        return compressed, encoding
+
+    def respond(self, request_headers, key, build):
+        """
+        Готовый Response с учётом Accept, Accept-Encoding и If-None-Match.
+
+        Совпавший If-None-Match даёт 304 без сжатия; тело сериализуется не больше раза на версию.
+        """
+        media_type = negotiate_media_type(request_headers.get("accept"))
+        etag = self.etag(key, media_type, build)
+        headers = {"ETag": etag, "Vary": "Accept, Accept-Encoding", "Cache-Control": "no-cache"}
+        if etag_matches(request_headers.get("if-none-match"), etag):
+            return Response(status_code=304, headers=headers)
+
+        encoding = negotiate_encoding(request_headers.get("accept-encoding"))
+        body, encoding = self.get(key, media_type, build, encoding, record=False)
+        if encoding is not None:
+            headers["Content-Encoding"] = encoding
+        return Response(content=body, media_type=media_type, headers=headers)
+
+    def invalidate(self):
+        self.bodies.clear()
+        self.etags.clear()
+        self.version = None
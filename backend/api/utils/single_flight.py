@@ -0,0 +1,100 @@
+# app/utils/single_flight.py
+import asyncio
+import time
+from backend.api.utils.deadline import SharedDeadline, current_deadline, wait_within_deadline, within_shared_deadline
+
+
+class SingleFlight:
+    """
+    Объединяет одинаковые одновременные запросы в один вызов upstream.
+
+    Ключ — кортеж (operation, country, number). Пока вызов по ключу выполняется, все
+    остальные запросы с тем же ключом ждут тот же future. Отмена одного из ожидающих
+    не отменяет общий вызов, а каждый ожидающий ждёт не дольше своего дедлайна.
+    Сам вызов идёт под общим дедлайном — самым поздним из дедлайнов ожидающих, — поэтому
+    повторы и hedging upstream прекращаются, когда ответ уже не нужен ни одному запросу.
+    """
+
+    def __init__(self):
+        self.in_flight = {}  # key -> (task, SharedDeadline)
+
+    def is_running(self, key):
+        return key in self.in_flight
+
+    async def do(self, key, fn):
+        deadline = current_deadline()
+        entry = self.in_flight.get(key)
+        if entry is None:
+            shared = SharedDeadline(deadline)
+            task = asyncio.create_task(within_shared_deadline(fn(), shared))
+            self.in_flight[key] = (task, shared)
+            task.add_done_callback(lambda done: self._forget(key, done))
+        else:
+            task, shared = entry
+            shared.extend(deadline)
+        return await wait_within_deadline(asyncio.shield(task))
+
+    def _forget(self, key, task):
+        entry = self.in_flight.get(key)
+        if entry is not None and entry[0] is task:
+            del self.in_flight[key]
+
+
+class ResultCache:
+    """Короткоживущий кэш результатов: опросы одного номера раз в секунду сводятся к одному запросу за TTL."""
+
+    def __init__(self, ttl=3.0, max_entries=10000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.entries = {}
+
+    def get(self, key):
+        """Возвращает (hit, value)."""
+        entry = self.entries.get(key)
+        if entry is None:
+            return False, None
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self.entries[key]
+            return False, None
+        return True, value
+
+    def set(self, key, value, ttl=None):
+        if len(self.entries) >= self.max_entries:
+            self.purge()
+            if len(self.entries) >= self.max_entries:
+                # Вытесняем самую старую запись (dict сохраняет порядок вставки)
+                self.entries.pop(next(iter(self.entries)))
+        self.entries[key] = (time.monotonic() + (self.ttl if ttl is None else ttl), value)
+
+    def purge(self):
+        now = time.monotonic()
+        for key in [key for key, (expires_at, _) in self.entries.items() if expires_at < now]:
+            del self.entries[key]
+
+
+class CoalescingCache:
+    """
+    SingleFlight + ResultCache: сначала кэш, затем общий вызов, результат кладётся в кэш.
+
+    ttl_for(result) позволяет задать свой TTL для отдельных результатов (например, пустых).
+    """
+
+    def __init__(self, ttl=3.0, max_entries=10000, ttl_for=None):
+        self.flight = SingleFlight()
+        self.results = ResultCache(ttl, max_entries)
+        self.ttl_for = ttl_for
+
+    async def get(self, key, fn, refresh=False):
+        """refresh=True — не читать кэш, а загрузить заново (одновременные вызовы всё равно объединяются)."""
+        if not refresh:
+            hit, value = self.results.get(key)
+            if hit:
+                return value
+
+        async def load():
+            result = await fn()
+            self.results.set(key, result, self.ttl_for(result) if self.ttl_for else None)
+            return result
+
+        return await self.flight.do(key, load)
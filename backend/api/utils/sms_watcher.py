@@ -0,0 +1,134 @@
+# app/utils/sms_watcher.py
+import asyncio
+import math
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from backend.api.utils.deadline import without_deadline
+from backend.api.utils.logger import logger
+
+DEFAULT_WATCH_CONFIG = {
+    "min_interval": 1.0,     # Самый частый опрос upstream, сек
+    "base_interval": 3.0,    # Интервал опроса для одного подписчика, сек
+    "max_interval": 15.0,    # Самый редкий опрос, когда долго нет новых SMS, сек
+    "idle_after": 60,        # Через сколько секунд без новых SMS начинаем опрашивать реже
+    "queue_size": 100,       # Буфер сообщений на подписчика; при переполнении теряются самые старые
+    "heartbeat": 15,         # Как часто слать клиенту keep-alive, сек
+    "max_duration": 600,     # Максимальная длительность одной подписки, сек
+}
+
+
+class NumberWatcher:
+    """Один опрос upstream на номер, результаты раздаются всем подписчикам."""
+
+    def __init__(self, hub, country, number):
+        self.hub = hub
+        self.country = country
+        self.number = number
+        self.subscribers = set()
+        # Память ограничена queue_size: upstream отдаёт только последние SMS (страница меньше
+        # этого лимита), поэтому забытые старые id повторно в ответе уже не появятся
+        self.history = hub.config["queue_size"]
+        self.seen_ids = {}        # id -> None в порядке получения, не больше history
+        self.known = deque(maxlen=self.history)  # Последние сообщения номера, от старых к новым
+        self.primed = asyncio.Event()  # Первый опрос выполнен: seen_ids содержит базовую линию
+        self.last_new_at = time.monotonic()
+        self.task = None
+
+    def interval(self):
+        """Чем больше подписчиков — тем чаще опрос; чем дольше нет новых SMS — тем реже."""
+        config = self.hub.config
+        interval = config["base_interval"] / (1 + math.log2(max(1, len(self.subscribers))))
+        idle = time.monotonic() - self.last_new_at
+        if idle > config["idle_after"]:
+            interval *= 2 ** min(4, idle / config["idle_after"])
+        return max(config["min_interval"], min(config["max_interval"], interval))
+
+    def publish(self, messages):
+        for queue in self.subscribers:
+            for message in messages:
+                if queue.full():
+                    queue.get_nowait()
+                queue.put_nowait(message)
+
+    def remember(self, messages):
+        for sms in messages:
+            self.seen_ids[sms["id"]] = None
+        while len(self.seen_ids) > self.history:
+            del self.seen_ids[next(iter(self.seen_ids))]
+        self.known.extend(messages)
+
+    async def poll(self):
+        while self.subscribers:
+            try:
+                sms_list = await self.hub.fetch(self.country, self.number)
+            except Exception as e:
+                self.hub.logging.warning("SMS watch poll failed for %s in %s: %r", self.number, self.country, e)
+                sms_list = []
+            # Upstream отдаёт от новых к старым; рассылаем в хронологическом порядке
+            new_messages = [sms for sms in reversed(sms_list) if sms["id"] not in self.seen_ids]
+            if new_messages:
+                self.remember(new_messages)
+                if self.primed.is_set():
+                    self.last_new_at = time.monotonic()
+                    self.publish(new_messages)
+            self.primed.set()
+            await asyncio.sleep(self.interval())
+
+
+class SmsWatchHub:
+    """
+    Подписки на новые SMS номера с общим опросом upstream.
+
+    На каждый номер работает один NumberWatcher, сколько бы клиентов его ни смотрели,
+    поэтому тысяча подписчиков стоит upstream столько же, сколько один.
+    """
+
+    def __init__(self, fetch, config=None):
+        self.logging = logger
+        self.fetch = fetch  # async fetch(country, number) -> список SMS
+        self.config = dict(DEFAULT_WATCH_CONFIG)
+        self.config.update(config or {})
+        self.watchers = {}
+
+    @asynccontextmanager
+    async def subscribe(self, country, number, replay=False):
+        """
+        Подписывает клиента на номер; внутри контекста отдаёт asyncio.Queue с новыми SMS.
+
+        replay=True сначала кладёт в очередь уже известные сообщения номера.
+        """
+        key = (country, number)
+        watcher = self.watchers.get(key)
+        if watcher is None:
+            watcher = NumberWatcher(self, country, number)
+            self.watchers[key] = watcher
+        queue = asyncio.Queue(maxsize=self.config["queue_size"])
+        watcher.subscribers.add(queue)
+        if watcher.task is None or watcher.task.done():
+            # Опрос живёт дольше запроса, который его запустил: дедлайн запроса на него не распространяется
+            watcher.task = asyncio.create_task(without_deadline(watcher.poll()))
+        try:
+            await watcher.primed.wait()
+            if replay:
+                for message in watcher.known:
+                    queue.put_nowait(message)
+            yield queue
+        finally:
+            watcher.subscribers.discard(queue)
+            if not watcher.subscribers:
+                watcher.task.cancel()
+                if self.watchers.get(key) is watcher:
+                    del self.watchers[key]
+
+    def stats(self):
+        return {
+            "watched_numbers": len(self.watchers),
+            "subscribers": sum(len(watcher.subscribers) for watcher in self.watchers.values()),
+        }
+
+    async def close(self):
+        for watcher in list(self.watchers.values()):
+            if watcher.task is not None:
+                watcher.task.cancel()
+        self.watchers.clear()
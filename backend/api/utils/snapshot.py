@@ -0,0 +1,146 @@
+# app/utils/snapshot.py
+import json
+import math
+import os
+import sqlite3
+import time
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS numbers_cache (
+    country TEXT PRIMARY KEY,
+    fetched_at REAL NOT NULL,
+    payload TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS demand (
+    key TEXT PRIMARY KEY,
+    score REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+INSERT OR IGNORE INTO meta (key, value) VALUES ('version', 0);
+"""
+
+
+class CacheSnapshot:
+    """
+    Снимок кэша номеров на диске (SQLite): по строке на страну с временем получения.
+
+    Позволяет после рестарта или reload сразу отдавать данные, не дожидаясь полного sweep.
+    База открывается в режиме WAL, поэтому её одновременно читают все воркеры, а пишет
+    один (лидер); счётчик version в таблице meta растёт с каждой записью.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def _connect(self):
+        connection = sqlite3.connect(self.path, timeout=5)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        connection.executescript(SCHEMA)
+        return connection
+
+    def save(self, entries):
+        """
+        Сохраняет записи {country: (value, fetched_at)} одной транзакцией.
+
+        Строка страны перезаписывается, только если запись свежее той, что уже в базе:
+        лидер не затирает то, что последователь только что загрузил при промахе. Версия
+        растёт, только если изменилась хотя бы одна строка. Возвращает (rows, size_bytes),
+        где rows — число действительно записанных стран.
+        """
+        rows = [
+            (country, fetched_at, json.dumps(value, ensure_ascii=False, separators=(",", ":")))
+            for country, (value, fetched_at) in entries.items()
+        ]
+        connection = self._connect()
+        try:
+            with connection:
+                before = connection.total_changes
+                connection.executemany(
+                    "INSERT INTO numbers_cache (country, fetched_at, payload) VALUES (?, ?, ?) "
+                    "ON CONFLICT(country) DO UPDATE SET fetched_at = excluded.fetched_at, payload = excluded.payload "
+                    "WHERE excluded.fetched_at > numbers_cache.fetched_at",
+                    rows,
+                )
+                written = connection.total_changes - before
+                if written:
+                    connection.execute("UPDATE meta SET value = value + 1 WHERE key = 'version'")
+        finally:
+            connection.close()
+        return written, self.size()
+
+    def load(self):
+        """Возвращает ({country: (value, fetched_at)}, elapsed_seconds). Пустой словарь, если снимка нет."""
+        started = time.perf_counter()
+        if not os.path.exists(self.path):
+            return {}, 0.0
+        connection = self._connect()
+        try:
+            rows = connection.execute("SELECT country, fetched_at, payload FROM numbers_cache").fetchall()
+        finally:
+            connection.close()
+        entries = {country: (json.loads(payload), fetched_at) for country, fetched_at, payload in rows}
+        return entries, time.perf_counter() - started
+
+    def add_demand(self, weights, decay_rate):
+        """
+        Прибавляет запросы воркера {key: weight} к общим затухающим счётчикам спроса.
+
+        Чтение и запись идут в одной транзакции BEGIN IMMEDIATE, чтобы одновременные
+        сбросы разных воркеров не теряли запросы друг друга.
+        """
+        now = time.time()
+        connection = self._connect()
+        try:
+            connection.isolation_level = None
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                placeholders = ",".join("?" * len(weights))
+                current = dict(
+                    (key, (score, updated_at))
+                    for key, score, updated_at in connection.execute(
+                        f"SELECT key, score, updated_at FROM demand WHERE key IN ({placeholders})", list(weights)
+                    )
+                )
+                rows = []
+                for key, weight in weights.items():
+                    score, updated_at = current.get(key, (0.0, now))
+                    rows.append((key, score * math.exp(-decay_rate * max(0.0, now - updated_at)) + weight, now))
+                connection.executemany("INSERT OR REPLACE INTO demand (key, score, updated_at) VALUES (?, ?, ?)", rows)
+                connection.execute("COMMIT")
+            except Exception:
+                connection.execute("ROLLBACK")
+                raise
+        finally:
+            connection.close()
+
+    def load_demand(self):
+        """Общие счётчики спроса {key: (score, updated_at)} (время по time.time())."""
+        if not os.path.exists(self.path):
+            return {}
+        connection = self._connect()
+        try:
+            rows = connection.execute("SELECT key, score, updated_at FROM demand").fetchall()
+        finally:
+            connection.close()
+        return {key: (score, updated_at) for key, score, updated_at in rows}
+
+    def version(self):
+        """Текущая версия снимка: по ней воркеры дёшево проверяют, изменилось ли что-то."""
+        if not os.path.exists(self.path):
+            return 0
+        connection = self._connect()
+        try:
+            return connection.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()[0]
+        finally:
+            connection.close()
+
+    def size(self):
+        return os.path.getsize(self.path) if os.path.exists(self.path) else 0
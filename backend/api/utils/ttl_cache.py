@@ -0,0 +1,116 @@
+# app/utils/ttl_cache.py
+import time
+
+# Состояния записи кэша
+FRESH = "fresh"        # Моложе soft TTL — отдаём как есть
+STALE = "stale"        # Между soft и hard TTL — отдаём и обновляем в фоне
+EXPIRED = "expired"    # Старше hard TTL — больше не отдаём
+MISS = "miss"          # Записи нет
+
+DEFAULT_CACHE_CONFIG = {
+    "soft_ttl": 600,       # Через сколько секунд запись считается устаревшей
+    "hard_ttl": 3600,      # Через сколько секунд устаревшие данные больше не отдаются
+    "refresh_margin": 60,  # Насколько заранее до срока фоновый цикл обновляет запись
+    "sms_ttl": 3,          # Сколько секунд переиспользуется результат запроса SMS
+    "changes_history": 256,  # Сколько последних diff по странам хранить для клиентов
+    "sms_fallback_ttl": 600,  # Сколько отдавать последний известный список SMS, если upstream недоступен
+    "negative_ttl": 120,     # Сколько помнить, что у страны нет номеров
+    "negative_sms_ttl": 5,   # Сколько помнить, что у номера нет SMS (коротко: код может прийти в любой момент)
+}
+
+
+class CacheEntry:
+    __slots__ = ("value", "fetched_at")
+
+    def __init__(self, value, fetched_at=None):
+        self.value = value
+        self.fetched_at = time.time() if fetched_at is None else fetched_at
+
+    def age(self, now=None):
+        return (time.time() if now is None else now) - self.fetched_at
+
+
+class SWRCache:
+    """
+    Кэш stale-while-revalidate с мягким и жёстким TTL.
+
+    Хранит время получения каждой записи (wall clock, чтобы его можно было сохранить
+    вместе с данными). Сам ничего не загружает: решение об обновлении принимает сервис.
+    """
+
+    def __init__(self, soft_ttl=600, hard_ttl=3600):
+        self.soft_ttl = soft_ttl
+        self.hard_ttl = max(hard_ttl, soft_ttl)
+        self.entries = {}
+
+    def set(self, key, value, fetched_at=None):
+        self.entries[key] = CacheEntry(value, fetched_at)
+
+    def touch(self, key):
+        """Отмечает запись как только что проверенную, не меняя данных."""
+        entry = self.entries.get(key)
+        if entry is not None:
+            entry.fetched_at = time.time()
+
+    def lookup(self, key, now=None):
+        """Возвращает (value, state). Для EXPIRED и MISS value равно None."""
+        entry = self.entries.get(key)
+        if entry is None:
+            return None, MISS
+        age = entry.age(now)
+        if age < self.soft_ttl:
+            return entry.value, FRESH
+        if age < self.hard_ttl:
+            return entry.value, STALE
+        return None, EXPIRED
+
+    def peek(self, key):
+        """Значение без учёта TTL — для деградации, когда upstream недоступен."""
+        entry = self.entries.get(key)
+        return entry.value if entry is not None else None
+
+    def get(self, key, default=None):
+        value, state = self.lookup(key)
+        return default if state in (EXPIRED, MISS) else value
+
+    def expiring(self, margin=0, now=None):
+        """Ключи, которым до soft TTL осталось меньше margin секунд (включая уже устаревшие)."""
+        now = time.time() if now is None else now
+        threshold = self.soft_ttl - margin
+        return [key for key, entry in self.entries.items() if entry.age(now) >= threshold]
+
+    def items(self):
+        """Пары (key, value) только для записей, которые ещё можно отдавать."""
+        now = time.time()
+        return [(key, entry.value) for key, entry in self.entries.items() if entry.age(now) < self.hard_ttl]
+
+    def dump(self):
+        """{key: (value, fetched_at)} для всех записей — для снимка на диске."""
+        return {key: (entry.value, entry.fetched_at) for key, entry in self.entries.items()}
+
+    def load(self, entries):
+        """
+        Загружает записи {key: (value, fetched_at)}, не перетирая более свежие.
+
+        Возвращает {key: прежнее значение или None} для записей, которые были заменены.
+        """
+        replaced = {}
+        for key, (value, fetched_at) in entries.items():
+            current = self.entries.get(key)
+            if current is None or current.fetched_at < fetched_at:
+                replaced[key] = current.value if current is not None else None
+                self.entries[key] = CacheEntry(value, fetched_at)
+        return replaced
+
+    def fetched_at(self, key):
+        entry = self.entries.get(key)
+        return entry.fetched_at if entry is not None else None
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __bool__(self):
+        return bool(self.entries)
@@ -0,0 +1,72 @@
+# benchmarks/asgi_client.py
+import asyncio
+import time
+from urllib.parse import urlsplit
+
+
+async def asgi_request(app, path, method="GET", headers=None, body=b""):
+    """
+    Выполняет один HTTP-запрос напрямую к ASGI-приложению, без сети и без httpx.
+
+    Возвращает (status, headers, body). Так бенчмарки меряют только стоимость приложения.
+    """
+    url = urlsplit(path)
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": method,
+        "scheme": "http",
+        "path": url.path,
+        "raw_path": url.path.encode(),
+        "query_string": url.query.encode(),
+        "root_path": "",
+        "headers": [(key.lower().encode(), value.encode()) for key, value in (headers or {}).items()],
+        "client": ("127.0.0.1", 50000),
+        "server": ("benchmark", 80),
+    }
+    request_sent = False
+    response_done = asyncio.Event()
+    status = None
+    response_headers = []
+    chunks = []
+
+    async def receive():
+        nonlocal request_sent
+        if not request_sent:
+            request_sent = True
+            return {"type": "http.request", "body": body, "more_body": False}
+        await response_done.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        nonlocal status, response_headers
+        if message["type"] == "http.response.start":
+            status = message["status"]
+            response_headers = message.get("headers", [])
+        elif message["type"] == "http.response.body":
+            chunks.append(message.get("body", b""))
+            if not message.get("more_body", False):
+                response_done.set()
+
+    await app(scope, receive, send)
+    response_done.set()
+    return status, {key.decode(): value.decode() for key, value in response_headers}, b"".join(chunks)
+
+
+async def measure_rps(app, path, requests=2000, concurrency=50, headers=None):
+    """Прогоняет requests запросов с заданной конкурентностью, возвращает (req/s, средний размер ответа)."""
+    semaphore = asyncio.Semaphore(concurrency)
+    sizes = []
+
+    async def one():
+        async with semaphore:
+            status, _, body = await asgi_request(app, path, headers=headers)
+            if status >= 400:
+                raise RuntimeError(f"{path} returned {status}")
+            sizes.append(len(body))
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(requests)))
+    elapsed = time.perf_counter() - started
+    return requests / elapsed, sum(sizes) / len(sizes)
@@ -0,0 +1,90 @@
+# benchmarks/bench_logging.py
+"""
+Накладные расходы логирования на один запрос — время, которое тратит сам поток event loop.
+
+Типичный запрос к /numbers/{country} с промахом кэша пишет 2 INFO-записи и 2 отладочные
+записи с полезной нагрузкой (список из 40 номеров), как раньше делал CacheManager.
+
+"before" — прежняя схема: уровень DEBUG, f-строки, синхронные FileHandler + консоль.
+"after"  — текущая: уровень INFO, ленивые %-аргументы, QueueHandler -> QueueListener в потоке.
+"after (debug on)" — то же, но DEBUG включён и ограничен RateLimitFilter.
+
+Запуск из каталога backend:  python benchmarks/bench_logging.py [requests]
+"""
+import logging
+import queue
+import tempfile
+import time
+import os
+import sys
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '../..'))
+if project_root not in sys.path:
+    sys.path.append(project_root)
+from backend.api.utils.logger import TEXT_FORMAT, build_logging_config, build_queue_handler
+from backend.benchmarks.fixtures import fake_numbers
+
+
+def make_logger(name, level, handlers):
+    bench_logger = logging.Logger(name, level)
+    for handler in handlers:
+        bench_logger.addHandler(handler)
+    return bench_logger
+
+
+def direct_handlers(log_dir):
+    formatter = logging.Formatter(TEXT_FORMAT)
+    handlers = [
+        logging.FileHandler(os.path.join(log_dir, "before.txt"), encoding="utf-8"),
+        logging.StreamHandler(open(os.devnull, "w")),
+    ]
+    for handler in handlers:
+        handler.setFormatter(formatter)
+    return handlers
+
+
+def request_eager(bench_logger, country, numbers):
+    bench_logger.info(f"Cache MISS for country: {country}. Updating cache...")
+    bench_logger.debug(f"Fetched numbers for {country}: {numbers}")
+    bench_logger.debug(f"Sorted numbers: {numbers}")
+    bench_logger.info(f"Cache updated for country: {country}")
+
+
+def request_lazy(bench_logger, country, numbers):
+    bench_logger.info("Cache %s for country: %s. Updating cache...", "MISS", country)
+    bench_logger.debug("Fetched numbers for %s: %s", country, numbers)
+    bench_logger.debug("Sorted numbers: %s", numbers)
+    bench_logger.info("Cache updated for country: %s", country)
+
+
+def measure(request, bench_logger, requests):
+    numbers = fake_numbers("usa", 40)
+    started = time.perf_counter()
+    for _ in range(requests):
+        request(bench_logger, "usa", numbers)
+    return (time.perf_counter() - started) / requests * 1e6
+
+
+def main():
+    requests = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    with tempfile.TemporaryDirectory() as log_dir:
+        before = make_logger("before", logging.DEBUG, direct_handlers(log_dir))
+        before_us = measure(request_eager, before, requests)
+
+        config = build_logging_config({"dir": log_dir})
+        after = make_logger("after", logging.INFO, [build_queue_handler(queue.SimpleQueue(), config)])
+        after_us = measure(request_lazy, after, requests)
+
+        debug_on = make_logger("after-debug", logging.DEBUG, [build_queue_handler(queue.SimpleQueue(), config)])
+        debug_us = measure(request_lazy, debug_on, requests)
+
+        for handler in before.handlers:
+            handler.close()
+
+    print(f"{requests} requests, 4 log calls each (time spent in the calling thread)")
+    print(f"before:           {before_us:8.1f} us/request")
+    print(f"after:            {after_us:8.1f} us/request")
+    print(f"after (debug on): {debug_us:8.1f} us/request")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+# benchmarks/bench_number_memory.py
+"""
+Память полного кэша номеров (64 страны): список словарей против колоночного NumberIndex.
+
+"dicts"   — прежнее представление: на каждый номер словарь из parse_fresh_numbers со своими
+            копиями строк страны и возраста (как после json.loads ответа upstream).
+"columns" — текущий NumberIndex: кортежи строк, массив возрастов, интернированные страна и возраст.
+Сами строки номеров в обоих вариантах одни и те же объекты из ответа upstream и в замер не входят.
+
+Запуск из каталога backend:  python benchmarks/bench_number_memory.py [numbers_per_country] [refreshes]
+"""
+import gc
+import json
+import tracemalloc
+import os
+import sys
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '../..'))
+if project_root not in sys.path:
+    sys.path.append(project_root)
+from backend.api.config import onlinesim_config
+from backend.api.libs.number_index import NumberIndex
+from backend.api.libs.onlinesim_lib import parse_fresh_numbers, sort_numbers
+from backend.benchmarks.fixtures import fake_numbers
+
+
+def upstream_payload(country, count, seed):
+    """Ответ upstream в исходном формате, пропущенный через JSON, как при реальном запросе."""
+    numbers = [
+        {"full_number": number["full_number"], "number": number["number"], "data_humans": number["age"]}
+        for number in fake_numbers(country, count, seed=f"{country}-{seed}")
+    ]
+    return json.loads(json.dumps({"numbers": numbers}))
+
+
+def measure(build):
+    """Сколько байт удерживает результат build() (по tracemalloc)."""
+    gc.collect()
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    cache = build()
+    gc.collect()
+    used = tracemalloc.get_traced_memory()[0] - baseline
+    tracemalloc.stop()
+    return used, cache
+
+
+def main():
+    numbers_per_country = int(sys.argv[1]) if len(sys.argv) > 1 else 40
+    refreshes = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+    countries = onlinesim_config["countries"]
+    # Ответы upstream готовим заранее, чтобы в замер попал только сам кэш
+    payloads = [
+        {country: upstream_payload(country, numbers_per_country, seed) for country in countries}
+        for seed in range(refreshes)
+    ]
+
+    def build_dicts():
+        cache = {}
+        for payload in payloads:  # Несколько обновлений подряд: в кэше остаётся последнее
+            for country in countries:
+                cache[country] = sort_numbers(parse_fresh_numbers(payload[country], country))
+        return cache
+
+    def build_columns():
+        cache = {}
+        for payload in payloads:
+            for country in countries:
+                cache[country] = NumberIndex.from_numbers(
+                    parse_fresh_numbers(payload[country], country), country
+                )
+        return cache
+
+    dicts_bytes, dicts_cache = measure(build_dicts)
+    total = sum(len(numbers) for numbers in dicts_cache.values())
+    del dicts_cache
+    columns_bytes, columns_cache = measure(build_columns)
+    assert sum(len(index) for index in columns_cache.values()) == total
+
+    print(f"{len(countries)} countries, {total} numbers, {refreshes} refreshes")
+    print(f"dicts:   {dicts_bytes / 1024:10.1f} KiB  ({dicts_bytes / total:6.1f} B/number)")
+    print(f"columns: {columns_bytes / 1024:10.1f} KiB  ({columns_bytes / total:6.1f} B/number)")
+    print(f"saved:   {(1 - columns_bytes / dicts_bytes) * 100:.1f}%")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+# benchmarks/bench_numbers_api.py
+"""
+Requests/sec для /numbers/countries и /numbers/{country} на полностью заполненном кэше (64 страны).
+
+"before" — прежний обработчик: dict -> jsonable_encoder -> json на каждый запрос.
+"after"  — текущий роутер: тело сериализуется один раз на версию кэша и отдаётся как bytes.
+
+Запуск из каталога backend:  python benchmarks/bench_numbers_api.py [requests] [concurrency]
+"""
+import asyncio
+import os
+import sys
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '../..'))
+if project_root not in sys.path:
+    sys.path.append(project_root)
+from fastapi import FastAPI
+from backend.api.dependencies import container
+from backend.api.routes.onlinesim_routes import router
+from backend.benchmarks.asgi_client import measure_rps
+from backend.benchmarks.fixtures import populate_service
+
+
+def build_baseline_app(service):
+    """Копия обработчиков до предсериализации: каждый запрос заново кодирует dict."""
+    app = FastAPI()
+
+    @app.get("/numbers/countries")
+    async def get_countries():
+        fresh_countries = await service.get_cache()
+        return {"countries": fresh_countries}
+
+    @app.get("/numbers/{country}")
+    async def get_country_numbers(country: str):
+        numbers = await service.get_numbers(country)
+        return {"country": country, "numbers": numbers}
+
+    return app
+
+
+def build_current_app():
+    app = FastAPI()
+    app.include_router(router, prefix="/numbers")
+    return app
+
+
+async def main(requests, concurrency):
+    onlinesim_service = container.get("onlinesim")
+    populate_service(onlinesim_service)
+    apps = {"before": build_baseline_app(onlinesim_service), "after": build_current_app()}
+    cases = [
+        ("/numbers/countries", None),
+        ("/numbers/usa", None),
+        ("/numbers/countries", {"accept": "application/msgpack"}),
+        ("/numbers/countries", {"accept-encoding": "gzip, br"}),
+    ]
+    print(f"{'path':<24}{'accept':<22}{'variant':<8}{'req/s':>10}{'bytes':>10}")
+    for path, headers in cases:
+        for variant, app in apps.items():
+            if variant == "before" and headers:
+                continue
+            rps, size = await measure_rps(app, path, requests, concurrency, headers)
+            accept = ", ".join((headers or {}).values()) or "application/json"
+            print(f"{path:<24}{accept:<22}{variant:<8}{rps:>10.0f}{size:>10.0f}")
+
+
+if __name__ == "__main__":
+    total = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    parallel = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    asyncio.run(main(total, parallel))
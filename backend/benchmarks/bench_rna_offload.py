@@ -0,0 +1,136 @@
+# benchmarks/bench_rna_offload.py
+"""
+Задержка /numbers/{country}, пока RNA-маршруты под нагрузкой.
+
+Зонд раз в 10 мс запрашивает /numbers/usa на заполненном кэше, а параллельно несколько
+клиентов без пауз дёргают /rna/generate/names (namegen.jp подменён блокирующим ответом
+с задержкой --names-delay) или /rna/generate/password?count=100&length=128.
+
+"before" — прежние обработчики: генерация прямо в async-обработчике, на event loop.
+"after"  — текущий роутер: имена в пуле потоков, крупные пачки паролей в пуле процессов.
+
+Запуск из каталога backend:  python benchmarks/bench_rna_offload.py [seconds] [clients] [--names-delay=0.2]
+"""
+import asyncio
+import statistics
+import time
+import os
+import sys
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '../..'))
+if project_root not in sys.path:
+    sys.path.append(project_root)
+from fastapi import FastAPI, Query
+from backend.api.dependencies import container
+from backend.api.libs.generate_passwords import generate_passwords
+from backend.api.libs.japanese_name_generator import JapaneseNameGenerator
+from backend.api.routes.onlinesim_routes import router as onlinesim_router
+from backend.api.routes.rna_routes import router as rna_router
+from backend.benchmarks.asgi_client import asgi_request
+from backend.benchmarks.fixtures import populate_service
+
+FAKE_NAMES_PAGE = "<table>" + "".join(f'<tr><td class="name">Name {i}</td></tr>' for i in range(40)) + "</table>"
+
+
+class FakeResponse:
+    text = FAKE_NAMES_PAGE
+
+
+def fake_namegen(delay):
+    """Подменяет запрос к namegen.jp блокирующим ожиданием delay секунд, как медленный upstream."""
+    def send_request(self, url):
+        time.sleep(delay)
+        return FakeResponse()
+    JapaneseNameGenerator.send_request = send_request
+
+
+def build_baseline_app():
+    """Копия RNA-обработчиков до выноса в пулы: всё выполняется на event loop."""
+    app = FastAPI()
+    app.include_router(onlinesim_router, prefix="/numbers")
+
+    @app.get("/rna/generate/names")
+    async def names(num_names: int = Query(1)):
+        return {"names": JapaneseNameGenerator(num_names=num_names).generate_names()}
+
+    @app.get("/rna/generate/password")
+    async def password(count: int = Query(1), length: int = Query(8)):
+        return {"passwords": [generate_passwords(num_passwords=1, length=length)[0] for _ in range(count)]}
+
+    return app
+
+
+def build_current_app():
+    app = FastAPI()
+    app.include_router(onlinesim_router, prefix="/numbers")
+    app.include_router(rna_router, prefix="/rna")
+    return app
+
+
+async def measure(app, load_path, clients, seconds):
+    """Возвращает задержки зонда /numbers/usa (мс) и число выполненных запросов нагрузки."""
+    stop = asyncio.Event()
+    latencies = []
+    completed = 0
+
+    async def load():
+        nonlocal completed
+        while not stop.is_set():
+            await asgi_request(app, load_path)
+            completed += 1
+
+    async def probe():
+        while not stop.is_set():
+            started = time.perf_counter()
+            status, _, _ = await asgi_request(app, "/numbers/usa")
+            latencies.append((time.perf_counter() - started) * 1000)
+            if status != 200:
+                raise RuntimeError(f"/numbers/usa returned {status}")
+            await asyncio.sleep(0.01)
+
+    tasks = [asyncio.create_task(load()) for _ in range(clients if load_path else 0)]
+    tasks.append(asyncio.create_task(probe()))
+    await asyncio.sleep(seconds)
+    stop.set()
+    await asyncio.gather(*tasks)
+    return latencies, completed
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+async def main(seconds, clients, names_delay):
+    fake_namegen(names_delay)
+    populate_service(container.get("onlinesim"))
+    apps = {"before": build_baseline_app(), "after": build_current_app()}
+    loads = [
+        ("idle", None),
+        ("names", "/rna/generate/names?num_names=3"),
+        ("passwords", "/rna/generate/password?count=100&length=128"),
+    ]
+    # Прогрев: пул процессов и ленивые сервисы создаются до замеров
+    await asgi_request(apps["after"], "/rna/generate/password?count=100&length=128")
+
+    print(f"/numbers/usa probe latency, {clients} load clients, {seconds}s per case, namegen delay {names_delay * 1000:.0f} ms")
+    print(f"{'load':<11}{'variant':<8}{'p50 ms':>9}{'p99 ms':>9}{'max ms':>9}{'probes':>8}{'load req':>10}")
+    for load_name, load_path in loads:
+        for variant, app in apps.items():
+            if load_path is None and variant == "before":
+                continue
+            latencies, completed = await measure(app, load_path, clients, seconds)
+            print(
+                f"{load_name:<11}{variant:<8}{statistics.median(latencies):9.1f}{percentile(latencies, 0.99):9.1f}"
+                f"{max(latencies):9.1f}{len(latencies):8d}{completed:10d}"
+            )
+    await container.close()
+
+
+if __name__ == "__main__":
+    positional = [arg for arg in sys.argv[1:] if not arg.startswith("--")]
+    delay = next((float(arg.split("=", 1)[1]) for arg in sys.argv[1:] if arg.startswith("--names-delay=")), 0.2)
+    asyncio.run(main(
+        float(positional[0]) if positional else 3.0,
+        int(positional[1]) if len(positional) > 1 else 4,
+        delay,
+    ))
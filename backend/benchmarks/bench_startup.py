@@ -0,0 +1,101 @@
+# benchmarks/bench_startup.py
+"""
+Холодный старт backend: время импорта api.main и первых запросов, в отдельном процессе на прогон.
+
+Печатает медиану по прогонам для:
+  import      — import backend.api.main (роутеры, middleware, конфиги; сервисы ещё не созданы);
+  /numbers/changes, /rna/generate/password — первый и второй запрос (первый создаёт сервис в контейнере);
+  deferred RNA imports — то, что раньше грузилось при старте, а теперь при первом /rna/generate/names
+                         (сервис имён, requests, bs4, unidecode).
+и какие тяжёлые модули загружены сразу после импорта. С --importtime — топ модулей по -X importtime.
+
+Запуск из каталога backend:  python benchmarks/bench_startup.py [runs] [--importtime]
+"""
+import json
+import os
+import statistics
+import subprocess
+import sys
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '../..'))
+if project_root not in sys.path:
+    sys.path.append(project_root)
+
+HEAVY_MODULES = ("aiohttp", "requests", "bs4", "unidecode", "slowapi", "orjson", "msgpack", "brotli")
+
+CHILD = r"""
+import asyncio, json, sys, time
+started = time.perf_counter()
+from backend.api.main import app
+timings = {"import": time.perf_counter() - started}
+loaded = [name for name in HEAVY_MODULES if name in sys.modules]
+from backend.api.dependencies import container
+from backend.benchmarks.asgi_client import asgi_request
+
+async def requests():
+    for path in ("/numbers/changes", "/rna/generate/password?count=5"):
+        for attempt in ("first", "second"):
+            started = time.perf_counter()
+            status, _, _ = await asgi_request(app, path)
+            timings[f"{path.split('?')[0]} {attempt}"] = time.perf_counter() - started
+            if status != 200:
+                raise RuntimeError(f"{path} returned {status}")
+
+asyncio.run(requests())
+started = time.perf_counter()
+container.get("japanese_names")
+from bs4 import BeautifulSoup
+from unidecode import unidecode
+timings["deferred RNA imports"] = time.perf_counter() - started
+print(json.dumps({"timings": timings, "loaded": loaded}))
+"""
+
+
+def child_env():
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [project_root, env.get("PYTHONPATH")]))
+    env.setdefault("ONLINE_SIM_API_KEY", "benchmark")
+    return env
+
+
+def run_once():
+    code = f"HEAVY_MODULES = {HEAVY_MODULES!r}\n{CHILD}"
+    result = subprocess.run(
+        [sys.executable, "-c", code], env=child_env(), cwd=project_root,
+        capture_output=True, text=True, check=True,
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def import_profile(top=15):
+    """Самые дорогие модули по -X importtime (cumulative), при импорте api.main."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import backend.api.main"],
+        env=child_env(), cwd=project_root, capture_output=True, text=True, check=True,
+    )
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = (part.strip() for part in line[len("import time:"):].split("|"))
+        rows.append((int(cumulative), name))
+    return sorted(rows, reverse=True)[:top]
+
+
+def main():
+    runs = int(next((arg for arg in sys.argv[1:] if arg.isdigit()), 5))
+    results = [run_once() for _ in range(runs)]
+
+    print(f"{runs} cold starts, median:")
+    for key in results[0]["timings"]:
+        median = statistics.median(result["timings"][key] for result in results)
+        print(f"  {key:<36}{median * 1000:9.1f} ms")
+    print(f"heavy modules loaded by import: {', '.join(results[0]['loaded']) or 'none'}")
+
+    if "--importtime" in sys.argv:
+        print("top imports (cumulative):")
+        for cumulative, name in import_profile():
+            print(f"  {cumulative / 1000:9.1f} ms  {name}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,32 @@
+# benchmarks/fixtures.py
+import random
+from backend.api.config import onlinesim_config
+
+AGES = ["5 minutes ago", "an hour ago", "3 hours ago", "12 hours ago", "1 day ago", "2 days ago", "4 days ago", "6 days ago"]
+
+
+def fake_numbers(country, count=40, seed=None):
+    """Синтетический ответ upstream для страны в формате parse_fresh_numbers."""
+    rng = random.Random(seed if seed is not None else country)
+    numbers = []
+    for _ in range(count):
+        number = str(rng.randint(10 ** 9, 10 ** 10 - 1))
+        age = rng.choice(AGES)
+        numbers.append({
+            "country": country,
+            "full_number": f"+1{number}",
+            "number": number,
+            "age": age,
+        })
+    return numbers
+
+
+def populate_service(service, numbers_per_country=40):
+    """Заполняет кэш сервиса всеми 64 странами из конфига, без обращения к upstream."""
+    from backend.api.libs.number_index import NumberIndex
+    service.snapshot = None
+    service.leader_lock = None
+    for country in onlinesim_config["countries"]:
+        index = NumberIndex.from_numbers(fake_numbers(country, numbers_per_country), country)
+        service.apply_numbers(country, index.to_list(), None)
+    return service
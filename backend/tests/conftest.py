@@ -0,0 +1,31 @@
+# tests/conftest.py
+import json
+import os
+import sys
+from types import SimpleNamespace
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '../..'))
+if project_root not in sys.path:
+    sys.path.append(project_root)
+os.environ.setdefault("ONLINE_SIM_API_KEY", "test")
+import pytest
+
+
+@pytest.fixture
+def upstream(monkeypatch):
+    """
+    Подменяет один GET к upstream (onlinesim_lib._get_once).
+
+    upstream.handler(url) — async-функция, возвращающая тело ответа (dict) или
+    поднимающая UpstreamError; upstream.calls — список запрошенных URL.
+    """
+    from backend.api.libs import onlinesim_lib
+
+    state = SimpleNamespace(calls=[], handler=None)
+
+    async def get_once(session, url, headers, breaker=None):
+        state.calls.append(url)
+        data = await state.handler(url)
+        return 200, {}, json.dumps(data).encode()
+
+    monkeypatch.setattr(onlinesim_lib, "_get_once", get_once)
+    return state
@@ -0,0 +1,35 @@
+# tests/support.py
+import copy
+from types import SimpleNamespace
+from fastapi import FastAPI
+from backend.api.config import onlinesim_config
+from backend.api.dependencies import get_onlinesim_service
+from backend.api.routes.onlinesim_routes import router as onlinesim_router
+from backend.api.utils.deadline import DeadlineMiddleware
+
+
+def service_config(**sections):
+    """Конфиг onlinesim без снимка на диске; sections дополняют одноимённые разделы."""
+    config = copy.deepcopy(onlinesim_config)
+    config["snapshot"] = {"enabled": False}
+    config["shared"] = {"enabled": False}
+    for name, values in sections.items():
+        config[name] = {**config.get(name, {}), **values}
+    return config
+
+
+def make_service(config):
+    """OnlinesimService без сети: сессия-заглушка, upstream подменяют сами тесты."""
+    from backend.api.services.onlinesim_service import OnlinesimService
+    service = OnlinesimService(config)
+    service.attach_session(SimpleNamespace(closed=False))
+    return service
+
+
+def build_app(service, budget=10.0):
+    """Приложение только с маршрутами /numbers и дедлайном, как в api.main."""
+    app = FastAPI()
+    app.include_router(onlinesim_router, prefix="/numbers")
+    app.add_middleware(DeadlineMiddleware, budget=budget, path_prefix="/numbers")
+    app.dependency_overrides[get_onlinesim_service] = lambda: service
+    return app
@@ -0,0 +1,56 @@
+# tests/test_deadline.py
+import asyncio
+import time
+from backend.api.libs.onlinesim_lib import UpstreamError
+from backend.benchmarks.asgi_client import asgi_request
+from backend.tests.support import build_app, make_service, service_config
+
+# Много попыток и короткая пауза: без дедлайна повторы шли бы ещё долго после ответа клиенту
+RETRY_POLICY = {"max_attempts": 20, "retry_delay": 0.02, "min_attempt_budget": 0.0, "hedge": False}
+
+
+def test_retries_stop_at_request_budget(upstream):
+    async def failing(url):
+        await asyncio.sleep(0.1)
+        raise UpstreamError(url, 503, "Service Unavailable")
+
+    upstream.handler = failing
+    service = make_service(service_config(deadline=RETRY_POLICY))
+    app = build_app(service, budget=0.35)
+
+    async def scenario():
+        started = time.monotonic()
+        status, _, _ = await asgi_request(app, "/numbers/usa")
+        elapsed = time.monotonic() - started
+        calls_at_response = len(upstream.calls)
+        await asyncio.sleep(0.5)
+        return status, elapsed, calls_at_response
+
+    status, elapsed, calls_at_response = asyncio.run(scenario())
+    assert elapsed < 0.6
+    assert status in (502, 504)
+    # Повторы прекращаются вместе с бюджетом запроса, а не через max_attempts
+    assert 2 <= calls_at_response <= 4
+    assert len(upstream.calls) == calls_at_response
+    assert service.upstream_policy.counters["retries"] < RETRY_POLICY["max_attempts"] - 1
+
+
+def test_shared_call_lives_until_latest_waiter_deadline(upstream):
+    async def slow(url):
+        await asyncio.sleep(0.4)
+        return {"numbers": [{"full_number": "+12025550123", "number": "2025550123", "data_humans": "5 minutes ago"}]}
+
+    upstream.handler = slow
+    service = make_service(service_config(deadline=RETRY_POLICY))
+    short = build_app(service, budget=0.2)
+    long = build_app(service, budget=2.0)
+
+    async def scenario():
+        first = asyncio.create_task(asgi_request(short, "/numbers/usa"))
+        await asyncio.sleep(0.05)
+        second = asyncio.create_task(asgi_request(long, "/numbers/usa"))
+        return (await first)[0], (await second)[0]
+
+    # Запрос с коротким бюджетом получает 504, но общий вызов доживает до ответа второму
+    assert asyncio.run(scenario()) == (504, 200)
+    assert len(upstream.calls) == 1
@@ -0,0 +1,59 @@
+# tests/test_shared_cache.py
+import asyncio
+from backend.tests.support import make_service, service_config
+
+NUMBERS = {"numbers": [{"full_number": "+12025550123", "number": "2025550123", "data_humans": "5 minutes ago"}]}
+
+
+def shared_services(tmp_path):
+    """Лидер и последователь с общим снимком и блокировкой, как два воркера uvicorn."""
+    config = service_config(
+        snapshot={"enabled": True, "path": str(tmp_path / "numbers_cache.sqlite3")},
+        shared={"enabled": True, "lock_path": str(tmp_path / "refresh.lock")},
+    )
+    leader, follower = make_service(config), make_service(config)
+    assert leader.acquire_leadership()
+    assert not follower.acquire_leadership()
+    return leader, follower
+
+
+def test_leader_picks_up_country_loaded_by_follower(tmp_path, upstream):
+    async def numbers(url):
+        return NUMBERS
+
+    upstream.handler = numbers
+    leader, follower = shared_services(tmp_path)
+
+    async def scenario():
+        # Последователь загружает страну при промахе и пишет её в снимок
+        assert await follower.get_numbers("usa")
+        await follower.share_demand()
+        await leader.leader_tick()
+        assert "usa" in leader.number_cache.entries
+        assert len(upstream.calls) == 1  # Лидер взял страну из снимка, а не из upstream
+        # Запись устарела по интервалу спроса: следующий тик лидер обновляет её из upstream
+        leader.number_cache.entries["usa"].fetched_at -= leader.cache_config["hard_ttl"] - 1
+        await leader.leader_tick()
+        assert len(upstream.calls) == 2
+        await follower.sync_shared_cache()
+        return follower.number_cache.lookup("usa")[1]
+
+    # Обновлённая лидером запись попала в снимок, и последователь снова видит её свежей
+    assert asyncio.run(scenario()) == "fresh"
+    leader.release_leadership()
+
+
+def test_leader_miss_reads_snapshot_before_upstream(tmp_path, upstream):
+    async def numbers(url):
+        return NUMBERS
+
+    upstream.handler = numbers
+    leader, follower = shared_services(tmp_path)
+
+    async def scenario():
+        await follower.get_numbers("usa")
+        return await leader.get_numbers("usa")
+
+    assert asyncio.run(scenario())
+    assert len(upstream.calls) == 1
+    leader.release_leadership()
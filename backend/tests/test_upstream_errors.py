@@ -0,0 +1,61 @@
+# tests/test_upstream_errors.py
+import asyncio
+from backend.api.libs.onlinesim_lib import UpstreamError
+from backend.benchmarks.asgi_client import asgi_request
+from backend.tests.support import build_app, make_service, service_config
+
+NO_RETRIES = {"max_attempts": 1, "hedge": False}
+SMS = {"messages": {"data": [{"id": 1, "text": "Your code is 123456", "created_at": "2024-01-01 10:00:00"}]}}
+
+
+def test_numbers_outage_is_not_reported_as_not_found(upstream):
+    async def failing(url):
+        raise UpstreamError(url, 500, "Internal Server Error")
+
+    upstream.handler = failing
+    app = build_app(make_service(service_config(deadline=NO_RETRIES)))
+
+    async def scenario():
+        return [await asgi_request(app, "/numbers/usa") for _ in range(2)]
+
+    (first, first_headers, _), (second, second_headers, _) = asyncio.run(scenario())
+    assert first == 502 and "retry-after" in first_headers
+    # Страна на паузе после ошибки: upstream не спрашиваем, но и 404 не отдаём
+    assert second == 503 and int(second_headers["retry-after"]) >= 1
+    assert len(upstream.calls) == 1
+
+
+def test_sms_failure_is_not_cached(upstream):
+    responses = [UpstreamError("sms", None, "timeout"), SMS]
+
+    async def flaky(url):
+        response = responses.pop(0)
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+    upstream.handler = flaky
+    app = build_app(make_service(service_config(deadline=NO_RETRIES)))
+
+    async def scenario():
+        return [await asgi_request(app, "/numbers/usa/12025550123/sms") for _ in range(2)]
+
+    (first, _, _), (second, _, body) = asyncio.run(scenario())
+    assert first == 502
+    # Второй запрос сразу идёт в upstream: ошибка не закэширована как «SMS нет»
+    assert second == 200 and b"123456" in body
+    assert len(upstream.calls) == 2
+
+
+def test_empty_sms_answer_is_still_not_found(upstream):
+    async def empty(url):
+        return {"messages": {"data": []}}
+
+    upstream.handler = empty
+    app = build_app(make_service(service_config(deadline=NO_RETRIES)))
+
+    async def scenario():
+        return [(await asgi_request(app, "/numbers/usa/12025550123/sms"))[0] for _ in range(2)]
+
+    assert asyncio.run(scenario()) == [404, 404]
+    assert len(upstream.calls) == 1  # Настоящий пустой ответ кэшируется на negative_sms_ttl
@@ -14,6 +14,7 @@ from random_top_analyze import top_analyze, config
 from japanese_name_generator import JapaneseNameGenerator
 from generate_passwords import decorate_password, generate_passphrase, generate_passwords, generate_pronounceable_password, word_list
 from rss_parser3 import get_rss_feed, remove_adv_words, RSS_FEED_URL
+from profiling import init_profiling, timed
 
 __version__ = '0.1.4.1'
 
@@ -22,6 +23,7 @@ load_dotenv(env_path)
 
 app = Flask(__name__)
 app.config['SECRET_KEY'] = os.getenv('FLASK_SECRET_KEY', 'default_secret_key') # Use an environment variable or fallback
+init_profiling(app)
 
 
 routes_info = {
@@ -100,12 +102,13 @@ async def random_japanese_names():
 
         # Используем асинхронный класс для генерации имен
         generator = JapaneseNameGenerator()
-        names = await generator.generate_names(
-            num_names=num_names,
-            sex=sex,
-            firstname_rarity=firstname_rarity,
-            lastname_rarity=lastname_rarity
-        )
+        with timed("upstream"):
+            names = await generator.generate_names(
+                num_names=num_names,
+                sex=sex,
+                firstname_rarity=firstname_rarity,
+                lastname_rarity=lastname_rarity
+            )
 
         return render_template('random_japanese_names.html', names=names, version=__version__)
     else:
@@ -208,7 +211,8 @@ def get_feeds():
     rss_url = get_rss_url()
     print("RSS URL:", rss_url) 
     combined_feed = []
-    feeds = get_rss_feed(rss_url)
+    with timed("upstream"):
+        feeds = get_rss_feed(rss_url)
     combined_feed.extend(feeds)
 
     if combined_feed != last_feeds.get("combined_feed"):
@@ -225,10 +229,12 @@ def get_feeds():
 def get_article_text():
     article_url = request.args.get('url')
     try:
-        response = requests.get(article_url)
+        with timed("upstream"):
+            response = requests.get(article_url)
         if response.status_code == 200:
-            soup = BeautifulSoup(response.text, 'html.parser')
-            article_element = soup.find('article', class_='text')
+            with timed("parse"):
+                soup = BeautifulSoup(response.text, 'html.parser')
+                article_element = soup.find('article', class_='text')
             if article_element:
                 article_text = article_element.get_text()
                 cleaned_article_text = remove_adv_words(article_text)
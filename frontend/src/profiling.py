@@ -0,0 +1,275 @@
+# ServerTimings, frame_label, collapse и StackSampler намеренно повторяют
+# backend/api/utils/profiling.py: образ frontend собирается только из frontend/src
+# (см. frontend/Dockerfile) и импортировать пакет backend не может. Правки в этих
+# классах и функциях вносите в обе копии.
+import os
+import secrets
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+from flask import Response, abort, g, has_request_context, request
+
+
+class ServerTimings:
+    """Суммарное время и число вызовов по фазам одного запроса."""
+
+    __slots__ = ("started", "phases")
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.phases = {}  # phase -> [секунды, вызовов]
+
+    def add(self, phase, seconds):
+        entry = self.phases.get(phase)
+        if entry is None:
+            self.phases[phase] = [seconds, 1]
+        else:
+            entry[0] += seconds
+            entry[1] += 1
+
+    def header(self):
+        """Значение заголовка Server-Timing: фазы и общее время обработки, в мс."""
+        parts = [
+            f'{phase};dur={seconds * 1000:.1f};desc="{count}x"'
+            for phase, (seconds, count) in self.phases.items()
+        ]
+        parts.append(f"total;dur={(time.perf_counter() - self.started) * 1000:.1f}")
+        return ", ".join(parts)
+
+
+def record_timing(phase, seconds):
+    """Добавляет seconds к фазе текущего запроса; вне запроса ничего не делает."""
+    if has_request_context():
+        timings = g.get("server_timings")
+        if timings is not None:
+            timings.add(phase, seconds)
+
+
+@contextmanager
+def timed(phase):
+    """with timed("upstream"): ... — время блока попадает в Server-Timing текущего запроса."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_timing(phase, time.perf_counter() - started)
+
+
+def frame_label(frame):
+    code = frame.f_code
+    filename = "/".join(code.co_filename.replace("\\", "/").rsplit("/", 2)[-2:])
+    return f"{code.co_name} ({filename}:{code.co_firstlineno})".replace(";", ":")
+
+
+def collapse(frame):
+    """Стек кадра в формате collapsed stacks: корень слева, вызовы через ';'."""
+    labels = []
+    while frame is not None:
+        labels.append(frame_label(frame))
+        frame = frame.f_back
+    return ";".join(reversed(labels))
+
+
+class StackSampler:
+    """
+    Сэмплирующий профайлер: отдельный поток раз в interval снимает стеки потоков.
+
+    thread_ids — какие потоки сэмплировать (по умолчанию все, кроме самого сэмплера);
+    множество можно менять, пока сэмплер работает. Результат — collapsed stacks,
+    совместимые с flamegraph.pl/speedscope.
+    """
+
+    def __init__(self, interval=0.005, thread_ids=None, exclude=()):
+        self.interval = interval
+        self.thread_ids = thread_ids
+        self.exclude = frozenset(exclude)
+        self.stacks = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        return self
+
+    def _run(self):
+        own_id = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id or thread_id in self.exclude:
+                    continue
+                if self.thread_ids is not None and thread_id not in self.thread_ids:
+                    continue
+                self.stacks[collapse(frame)] += 1
+                self.samples += 1
+
+    def collapsed(self):
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+
+class RequestProfiler:
+    """
+    Профилирование следующих N запросов к маршруту.
+
+    Flask обрабатывает запрос в одном потоке, поэтому пока захват активен, before_request
+    добавляет поток подходящего запроса в множество сэмплируемых, а teardown_request убирает.
+    Маршрут сравнивается с правилом Flask (/get_article_text, /user/<int:id>), а не с путём.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.rule = None
+        self.remaining = 0
+        self.thread_ids = set()
+        self.finished = threading.Event()
+
+    def begin(self, rule):
+        """Вызывается в начале запроса; True, если запрос попал в профиль."""
+        with self.lock:
+            if self.rule is None or self.remaining <= 0 or rule != self.rule:
+                return False
+            self.remaining -= 1
+            self.thread_ids.add(threading.get_ident())
+            return True
+
+    def end(self):
+        with self.lock:
+            self.thread_ids.discard(threading.get_ident())
+            if self.remaining <= 0 and not self.thread_ids:
+                self.finished.set()
+
+    def capture(self, rule, requests, timeout, interval=0.005):
+        """Ждёт requests запросов к rule (не дольше timeout) и возвращает сэмплер с их стеками."""
+        with self.lock:
+            self.rule = rule
+            self.remaining = requests
+            self.thread_ids = set()
+            self.finished = threading.Event()
+            sampler = StackSampler(interval, thread_ids=self.thread_ids)
+        sampler.start()
+        try:
+            self.finished.wait(timeout)
+        finally:
+            sampler.stop()
+            with self.lock:
+                self.rule = None
+                self.remaining = 0
+        return sampler
+
+
+request_profiler = RequestProfiler()
+
+# Одновременно работает только один профайлер: сэмплы двух сессий смешались бы
+profile_lock = threading.Lock()
+
+
+def sample_threads(seconds, interval=0.005):
+    """Сэмплирует все потоки процесса, кроме вызывающего, seconds секунд."""
+    sampler = StackSampler(interval, exclude={threading.get_ident()}).start()
+    try:
+        time.sleep(seconds)
+    finally:
+        sampler.stop()
+    return sampler
+
+
+def admin_token():
+    """Токен администратора из окружения; без него админские эндпоинты выключены."""
+    return os.getenv("ADMIN_TOKEN") or None
+
+
+def require_admin():
+    token = admin_token()
+    if token is None:
+        abort(404)
+    provided = request.headers.get("X-Admin-Token")
+    if not provided or not secrets.compare_digest(provided, token):
+        abort(403)
+
+
+def _number_arg(name, default, low, high, cast=float):
+    value = request.args.get(name)
+    if value is None:
+        return default
+    try:
+        value = cast(value)
+    except ValueError:
+        abort(400, f"{name} must be a number")
+    if not low < value <= high:
+        abort(400, f"{name} must be in ({low}, {high}]")
+    return value
+
+
+def profile():
+    """
+    Сэмплирующий профайлер; ответ — collapsed stacks для flamegraph.pl или speedscope.
+
+    Либо ?seconds= секунд всех потоков процесса, либо только следующие ?requests=
+    запросов к ?route= (не дольше ?timeout=). Запрос держит поток, пока идёт сэмплирование,
+    поэтому нужен многопоточный сервер (как WsgiToAsgi под uvicorn); профилируется
+    только тот воркер, в который попал этот запрос.
+    """
+    require_admin()
+    seconds = _number_arg("seconds", None, 0, 120)
+    route = request.args.get("route")
+    requests = _number_arg("requests", 10, 0, 1000, cast=int)
+    timeout = _number_arg("timeout", 60, 0, 600)
+    interval = _number_arg("interval_ms", 5, 0, 100) / 1000
+
+    if (seconds is None) == (route is None):
+        abort(400, "Pass either seconds or route")
+    if not profile_lock.acquire(blocking=False):
+        abort(409, "Another profiling session is running")
+    try:
+        if route is not None:
+            sampler = request_profiler.capture(route, requests, timeout, interval)
+        else:
+            sampler = sample_threads(seconds, interval)
+    finally:
+        profile_lock.release()
+    return Response(
+        sampler.collapsed(),
+        mimetype="text/plain",
+        headers={"X-Profile-Samples": str(sampler.samples), "X-Profile-Pid": str(os.getpid())},
+    )
+
+
+def init_profiling(app, profiler=request_profiler):
+    """
+    Подключает к Flask-приложению заголовок Server-Timing и /admin/profile.
+
+    Фазы пишет код через timed()/record_timing() (upstream, parse, ...), total — время
+    от before_request до after_request.
+    """
+
+    @app.before_request
+    def start_server_timing():
+        g.server_timings = ServerTimings()
+        rule = request.url_rule.rule if request.url_rule is not None else None
+        g.profiled = rule is not None and profiler.begin(rule)
+
+    @app.after_request
+    def add_server_timing(response):
+        timings = g.get("server_timings")
+        if timings is not None:
+            response.headers["Server-Timing"] = timings.header()
+        return response
+
+    @app.teardown_request
+    def finish_profiling(exc):
+        if g.get("profiled"):
+            g.profiled = False
+            profiler.end()
+
+    app.add_url_rule("/admin/profile", "admin_profile", profile, methods=["GET"])
+    return app